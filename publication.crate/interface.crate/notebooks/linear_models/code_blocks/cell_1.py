@@ -1,10 +1,12 @@
 %reload_ext autotime
 import geopandas as gpd
+import numpy as np
+import os
 import pandas as pd
 from glob import glob
-from sklearn.linear_model import LinearRegression
 from tqdm.auto import tqdm
-from tqdm.contrib.concurrent import process_map
-from sklearn.metrics import mean_squared_error, r2_score, mean_absolute_error, root_mean_squared_error
-from coastsat import SDS_transects
-pd.options.plotting.backend = "plotly"
\ No newline at end of file
+from joblib import Parallel, cpu_count, delayed
+from numba import njit
+pd.options.plotting.backend = "plotly"
+# set PLOT=1 in the environment to draw the diagnostic figures
+PLOT = os.environ.get("PLOT") == "1"
\ No newline at end of file
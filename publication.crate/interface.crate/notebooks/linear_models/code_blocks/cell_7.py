@@ -1,30 +1,49 @@
 f = files[files.str.contains("sar1026")].iloc[0]
+transect_id = "sar1026-0007"
 # despiked_filename = f.replace(".csv", "_tidally_corrected.csv")
-df = pd.read_csv(f)
-df.dates = pd.to_datetime(df.dates)
+df = pd.read_csv(f, engine="pyarrow", usecols=["dates", transect_id], parse_dates=["dates"])
 df.set_index("dates", inplace=True)
-display(df.columns)
+if PLOT:
+    display(df.columns)
 import matplotlib.pyplot as plt
 
-transect_id = "sar1026-0007"
-
 
+@njit(nogil=True)
 def custom_mean(window):
-    return window[window.between(window.quantile(0.25), window.quantile(0.75))].mean()
+    # mean of the values within the interquartile range of the window
+    values = window[~np.isnan(window)]
+    q1_pos = 0.25 * (len(values) - 1)
+    q3_pos = 0.75 * (len(values) - 1)
+    kth = np.array(
+        [int(np.floor(q1_pos)), int(np.ceil(q1_pos)), int(np.floor(q3_pos)), int(np.ceil(q3_pos))]
+    )
+    ordered = np.partition(values, kth)
+    q1 = ordered[kth[0]] + (ordered[kth[1]] - ordered[kth[0]]) * (q1_pos - kth[0])
+    q3 = ordered[kth[2]] + (ordered[kth[3]] - ordered[kth[2]]) * (q3_pos - kth[2])
+    total = 0.0
+    count = 0
+    for value in values:
+        if q1 <= value <= q3:
+            total += value
+            count += 1
+    return total / count if count else np.nan
+
+
+numba_kwargs = {"raw": True, "engine": "numba", "engine_kwargs": {"nopython": True, "nogil": True}}
 
+if PLOT:
+    # one rolling object per window, shared by the plain and custom means
+    rolling_90d = df[transect_id].rolling("90d", min_periods=1)
+    rolling_180d = df[transect_id].rolling("180d", min_periods=1)
 
-pd.DataFrame(
-    {
-        "raw": df[transect_id],
-        "rolling 90d mean": df[transect_id].rolling("90d", min_periods=1).mean(),
-        "rolling 180d mean": df[transect_id].rolling("180d", min_periods=1).mean(),
-        "rolling 90d custom mean": df[transect_id]
-        .rolling("90d", min_periods=1)
-        .apply(custom_mean),
-        "rolling 180d custom mean": df[transect_id]
-        .rolling("180d", min_periods=1)
-        .apply(custom_mean),
-        # "rolling 365d": df[transect_id].rolling("365d", min_periods=1).mean(),
-    },
-    index=df.index,
-).plot()
\ No newline at end of file
+    pd.DataFrame(
+        {
+            "raw": df[transect_id],
+            "rolling 90d mean": rolling_90d.mean(),
+            "rolling 180d mean": rolling_180d.mean(),
+            "rolling 90d custom mean": rolling_90d.apply(custom_mean, **numba_kwargs),
+            "rolling 180d custom mean": rolling_180d.apply(custom_mean, **numba_kwargs),
+            # "rolling 365d": df[transect_id].rolling("365d", min_periods=1).mean(),
+        },
+        index=df.index,
+    ).plot().show()
\ No newline at end of file
@@ -1,63 +1,186 @@
-def despike(chainage, threshold=40):
-    chainage = chainage.dropna()
-    chainage, dates = SDS_transects.identify_outliers(
-        chainage.tolist(), chainage.index.tolist(), threshold
-    )
-    return pd.Series(chainage, index=dates)
+@njit(nogil=True)
+def despike_chainage(chainage, cross_change):
+    # port of SDS_transects.identify_outliers, returns a mask of the points to keep
+    keep = ~np.isnan(chainage)
+    rows = np.flatnonzero(keep)
+    values = chainage[rows]
+    n = len(values)
+    k = 0
+    while k < n and n > 1:
+        for k in range(n):
+            outlier = False
+            if k == 0:
+                outlier = abs(values[k] - values[k + 1]) > cross_change
+            elif k == n - 1:
+                outlier = abs(values[k] - values[k - 1]) > cross_change
+            else:
+                diff_m1 = values[k] - values[k - 1]
+                diff_p1 = values[k] - values[k + 1]
+                condition1 = abs(diff_m1) > cross_change
+                condition2 = abs(diff_p1) > cross_change
+                condition3 = np.sign(diff_p1) == np.sign(diff_m1)
+                outlier = condition1 and condition2 and condition3
+                if not outlier and k >= 2 and k < n - 2:
+                    diff_m2 = values[k - 1] - values[k - 2]
+                    diff_p2 = values[k + 1] - values[k + 2]
+                    condition4 = abs(diff_m2) > cross_change
+                    condition5 = abs(diff_p2) > cross_change
+                    condition6 = np.sign(diff_m1) == np.sign(diff_p2)
+                    condition7 = np.sign(diff_p1) == np.sign(diff_m2)
+                    if condition1 and condition5 and condition6:
+                        outlier = True
+                    elif condition2 and condition4 and condition7:
+                        outlier = True
+                    else:
+                        condition4b = abs(diff_m2) > 1.5 * cross_change
+                        condition5b = abs(diff_p2) > 1.5 * cross_change
+                        condition8 = np.sign(diff_m2) == np.sign(diff_p2)
+                        outlier = (
+                            condition4b and condition5b and not condition1 and not condition2 and condition8
+                        )
+            if outlier:
+                keep[rows[k]] = False
+                rows[k : n - 1] = rows[k + 1 : n]
+                values[k : n - 1] = values[k + 1 : n]
+                n -= 1
+                break
+        k = k + 1
+    return keep
+
+
+@njit(nogil=True)
+def despike_columns(chainages, cross_change):
+    # files are spread over threads by get_trends_chunk, so the columns are despiked serially
+    keep = np.empty(chainages.shape, dtype=np.bool_)
+    for j in range(chainages.shape[1]):
+        keep[:, j] = despike_chainage(chainages[:, j], cross_change)
+    return keep
+
+
+def despike(df, threshold=40):
+    keep = despike_columns(np.asfortranarray(df.to_numpy(dtype=np.float64)), threshold)
+    return df.where(keep)[keep.any(axis=1)]
+
+
+@njit(nogil=True)
+def fit_all(x, chainages):
+    # least squares fit of every column against x with its residual metrics, NaNs excluded per column;
+    # files are spread over threads by get_trends_chunk, so the columns are fitted serially
+    n_columns = chainages.shape[1]
+    n = np.zeros(n_columns, dtype=np.int64)
+    slope = np.zeros(n_columns)
+    intercept = np.zeros(n_columns)
+    r2 = np.full(n_columns, np.nan)
+    mae = np.full(n_columns, np.nan)
+    mse = np.full(n_columns, np.nan)
+    for j in range(n_columns):
+        y = chainages[:, j]
+        x_sum = 0.0
+        y_sum = 0.0
+        for i in range(len(x)):
+            if not np.isnan(y[i]):
+                n[j] += 1
+                x_sum += x[i]
+                y_sum += y[i]
+        if n[j] == 0:
+            continue
+        x_mean = x_sum / n[j]
+        y_mean = y_sum / n[j]
+        sxx = 0.0
+        sxy = 0.0
+        syy = 0.0
+        for i in range(len(x)):
+            if not np.isnan(y[i]):
+                dx = x[i] - x_mean
+                dy = y[i] - y_mean
+                sxx += dx * dx
+                sxy += dx * dy
+                syy += dy * dy
+        if sxx > 0:
+            slope[j] = sxy / sxx
+        intercept[j] = y_mean - slope[j] * x_mean
+        sse = 0.0
+        sae = 0.0
+        for i in range(len(x)):
+            if not np.isnan(y[i]):
+                residual = y[i] - (slope[j] * x[i] + intercept[j])
+                sse += residual * residual
+                sae += abs(residual)
+        mae[j] = sae / n[j]
+        mse[j] = sse / n[j]
+        # same conventions as sklearn's r2_score for constant and single-point series
+        if n[j] > 1:
+            if syy > 0:
+                r2[j] = 1 - sse / syy
+            else:
+                r2[j] = 0.0 if sse > 0 else 1.0
+    return n, slope, intercept, r2, mae, mse
+
+
+def rolling_mean(df, window):
+    # same as df.rolling(window, min_periods=1).mean() on a sorted DatetimeIndex, from prefix sums:
+    # row i averages the rows after the last one that is at least `window` older
+    values = df.to_numpy(dtype=np.float64)
+    valid = ~np.isnan(values)
+    sums = np.cumsum(np.vstack([np.zeros((1, values.shape[1])), np.where(valid, values, 0)]), axis=0)
+    counts = np.cumsum(np.vstack([np.zeros((1, values.shape[1]), dtype=np.int64), valid]), axis=0)
+    lo = df.index.searchsorted(df.index - pd.Timedelta(window), side="right")
+    hi = np.arange(1, len(df) + 1)
+    n = counts[hi] - counts[lo]
+    mean = np.divide(sums[hi] - sums[lo], n, out=np.full(n.shape, np.nan), where=n > 0)
+    return pd.DataFrame(mean, index=df.index, columns=df.columns)
+
+
+# the despiked and smoothed sar series are only needed for inspection, set to True to keep them next to the input
+save_intermediate = False
 
 
 def get_trends(f):
-    df = pd.read_csv(f)
-    try:
-        df.dates = pd.to_datetime(df.dates)
-    except:
-        print(f)
+    df = pd.read_csv(f, engine="pyarrow", parse_dates=["dates"], dtype={"satname": "category"})
     if "sar" in f:
-        smoothed_filename = f.replace(".csv", "_smoothed.csv")
+        smoothed_filename = f.replace(".csv", "_smoothed.feather")
         try:
             raise
-            df = pd.read_csv(smoothed_filename)
-            df.dates = pd.to_datetime(df.dates)
+            df = pd.read_feather(smoothed_filename)
         except:
-            df.dates = pd.to_datetime(df.dates)
             df.set_index("dates", inplace=True)
             satname = df.satname
-            df = df.drop(columns="satname").apply(despike, axis=0)
+            df = despike(df.drop(columns="satname"))
             df["satname"] = satname
-            df.reset_index(names="dates").to_csv(
-                f.replace(".csv", "_despiked.csv"), index=False
-            )
-            for transect_id in df.drop(columns="satname").columns:
-                df[transect_id] = df[transect_id].rolling("180d", min_periods=1).mean()
+            if save_intermediate:
+                df.reset_index(names="dates").to_feather(f.replace(".csv", "_despiked.feather"))
+            smoothed = rolling_mean(df.drop(columns="satname"), "180d")
+            df[smoothed.columns] = smoothed
             df.reset_index(names="dates", inplace=True)
-            df.to_csv(f.replace(".csv", "_smoothed.csv"), index=False)
+            if save_intermediate:
+                df.to_feather(smoothed_filename)
     df.index = (df.dates - df.dates.min()).dt.days / 365.25
     df.drop(columns=["dates", "satname", "Unnamed: 0"], inplace=True, errors="ignore")
-    trends = []
-    for transect_id in df.columns:
-        sub_df = df[transect_id].dropna()
-        if not len(sub_df):
-            continue
-        x = sub_df.index.to_numpy().reshape(-1, 1)
-        y = sub_df
-        linear_model = LinearRegression().fit(x, y)
-        pred = linear_model.predict(x)
-        trends.append(
-            {
-                "transect_id": transect_id,
-                "trend": linear_model.coef_[0],
-                "intercept": linear_model.intercept_,
-                "n_points": len(df[transect_id]),
-                "n_points_nonan": len(sub_df),
-                "r2_score": r2_score(y, pred),
-                "mae": mean_absolute_error(y, pred),
-                "mse": mean_squared_error(y, pred),
-                "rmse": root_mean_squared_error(y, pred),
-            }
-        )
-    return pd.DataFrame(trends)
+    x = df.index.to_numpy(dtype=np.float64)
+    n_points_nonan, trend, intercept, r2, mae, mse = fit_all(x, np.asfortranarray(df.to_numpy(dtype=np.float64)))
+    fitted = n_points_nonan > 0
+    return pd.DataFrame(
+        {
+            "transect_id": df.columns[fitted],
+            "trend": trend[fitted],
+            "intercept": intercept[fitted],
+            "n_points": len(df),
+            "n_points_nonan": n_points_nonan[fitted],
+            "r2_score": r2[fitted],
+            "mae": mae[fitted],
+            "mse": mse[fitted],
+            "rmse": np.sqrt(mse[fitted]),
+        }
+    )
+
+
+def get_trends_chunk(chunk):
+    return pd.concat([get_trends(f) for f in chunk])
 
 
 # trends = get_trends(sar_files.iloc[-1]).set_index("transect_id")
-trends = pd.concat(process_map(get_trends, files)).set_index("transect_id")
+chunks = np.array_split(files.to_numpy(), min(cpu_count(), len(files)))
+trends = pd.concat(
+    Parallel(n_jobs=-1, prefer="threads")(delayed(get_trends_chunk)(chunk) for chunk in chunks)
+).set_index("transect_id")
 len(trends)
\ No newline at end of file
@@ -2,6 +2,9 @@
 import geopandas as gpd
 import pandas as pd
 import numpy as np
+import os
+import nifty_ls
+from scipy import integrate
 from tqdm.auto import tqdm
 from glob import glob
 from shapely.geometry import LineString, Point
@@ -10,4 +13,6 @@ import matplotlib.pyplot as plt
 import pytz
 from datetime import datetime, timedelta
 pd.set_option('display.max_columns', None)
+# set PLOT=1 in the environment to draw the diagnostic figures
+PLOT = os.environ.get('PLOT') == '1'
 import SDS_slope
\ No newline at end of file
@@ -1,12 +1,46 @@
+def ls_power(t, y, freqs):
+  # PSD-normalised Lomb-Scargle on the regular SDS_slope frequency grid, computed with a NUFFT;
+  # the rows of a 2D y share the time vector and are transformed as one batch
+  return nifty_ls.lombscargle(t, y, fmin=freqs[0], fmax=freqs[-1], Nf=len(freqs),
+                              normalization="psd", backend="auto").power
+
+def simpson_avg(y, x):
+  # scipy's removed simps(y, x, even='avg') along the last axis, which SDS_slope integrates with:
+  # for an even number of samples, the mean of Simpson's rule on the first N-1 samples plus a
+  # trapezoid on the last interval and a trapezoid on the first interval plus Simpson's rule on the rest
+  if len(x) < 3 or len(x) % 2 == 1:
+    return integrate.simpson(y, x=x, axis=-1)
+  first = integrate.simpson(y[..., :-1], x=x[:-1], axis=-1) + 0.5*(x[-1]-x[-2])*(y[..., -1]+y[..., -2])
+  last = integrate.simpson(y[..., 1:], x=x[1:], axis=-1) + 0.5*(x[1]-x[0])*(y[..., 0]+y[..., 1])
+  return (first + last) / 2
+
+def integrate_power_spectrum(dates, tsall, settings):
+  # same as SDS_slope.integrate_power_spectrum, but all the candidate slopes go through one periodogram
+  t = pd.DatetimeIndex(dates).as_unit('ns').asi8 / 1e9
+  freqs = SDS_slope.frequency_grid(t, settings['n_days']*24*3600, settings['n0'])
+  beach_slopes = SDS_slope.range_slopes(settings['slope_min'], settings['slope_max'], settings['delta_slope'])
+  idx_interval = np.logical_and(freqs >= settings['freqs_max'][0], freqs <= settings['freqs_max'][1])
+  ps = ls_power(t, np.asarray(tsall, dtype='float64'), freqs)
+  E = simpson_avg(ps[:, idx_interval], freqs[idx_interval])
+  # confidence band: slopes whose energy is within prc_conf of the minimum
+  delta = 0.0001
+  beach_slopes_interp = SDS_slope.range_slopes(settings['slope_min'], settings['slope_max']-delta, delta)
+  E_interp = np.interp(beach_slopes_interp, beach_slopes, E)
+  slopes_min = beach_slopes_interp[E_interp <= np.min(E)*(1+settings['prc_conf'])]
+  slope = beach_slopes[np.argmin(E)]
+  ci = [slopes_min[0], slopes_min[-1]] if len(slopes_min) > 1 else [slope, slope]
+  return slope, ci
+
 if len(new_transects):
   for site_id in tqdm(new_transects.site_id.unique()):
-    df = pd.read_csv(f"data/{site_id}/transect_time_series.csv")
-    df.index = pd.to_datetime(df.dates)
-    df.drop(columns=["dates", "satname"], inplace=True)
-    tides = pd.read_csv("data/{site_id}/tides.csv")
-    tides.dates = pd.to_datetime(tides.dates)
-    tides.set_index("dates", inplace=True)
-    assert all(pd.to_datetime(df.index).round("10min") == tides.index)
+    df = pd.read_csv(f"data/{site_id}/transect_time_series.csv", engine="pyarrow", parse_dates=["dates"], index_col="dates", dtype={"satname": "category"})
+    df.drop(columns="satname", inplace=True)
+    tides = pd.read_csv(f"data/{site_id}/tides.csv", engine="pyarrow", parse_dates=["dates"], index_col="dates")
+    # tides.csv has one row per 10 minute slot, spread it back over the acquisitions
+    sat_times = df.index.round("10min")
+    tides = tides[~tides.index.duplicated()]
+    assert sat_times.isin(tides.index).all()
+    tides = tides.reindex(sat_times)
     # slope estimation settings
     days_in_year = 365.2425
     seconds_in_day = 24*3600
@@ -24,32 +58,33 @@ if len(new_transects):
                                     pytz.utc.localize(datetime(settings_slope['date_range'][1],1,1))]
     beach_slopes = SDS_slope.range_slopes(settings_slope['slope_min'], settings_slope['slope_max'], settings_slope['delta_slope'])
 
-    t = np.array([_.timestamp() for _ in df.index]).astype('float64')
-    delta_t = np.diff(t)
-    fig, ax = plt.subplots(1,1,figsize=(12,3), tight_layout=True)
-    ax.grid(which='major', linestyle=':', color='0.5')
-    bins = np.arange(np.min(delta_t)/seconds_in_day, np.max(delta_t)/seconds_in_day+1,1)-0.5
-    ax.hist(delta_t/seconds_in_day, bins=bins, ec='k', width=1);
-    ax.set(xlabel='timestep [days]', ylabel='counts',
-          xticks=7*np.arange(0,20),
-          xlim=[0,50], title='Timestep distribution');
+    if PLOT:
+      t = df.index.as_unit('ns').asi8 / 1e9
+      delta_t = np.diff(t)
+      fig, ax = plt.subplots(1,1,figsize=(12,3), tight_layout=True)
+      ax.grid(which='major', linestyle=':', color='0.5')
+      bins = np.arange(np.min(delta_t)/seconds_in_day, np.max(delta_t)/seconds_in_day+1,1)-0.5
+      ax.hist(delta_t/seconds_in_day, bins=bins, ec='k', width=1);
+      ax.set(xlabel='timestep [days]', ylabel='counts',
+            xticks=7*np.arange(0,20),
+            xlim=[0,50], title='Timestep distribution');
 
     # find tidal peak frequency (can choose 7 or 8 in this case)
     settings_slope['n_days'] = 7
     settings_slope['freqs_max'] = SDS_slope.find_tide_peak(df.index,tides.tide,settings_slope)
     # estimate beach-face slopes along the transects
     slope_est, cis = dict([]), dict([])
-    for key in df.keys():
+    # apply tidal correction for every transect and slope at once, shape (dates, transects, slopes)
+    tsall_all = df.to_numpy()[:,:,None] + tides.tide.to_numpy()[:,None,None] * (1.0/beach_slopes)[None,None,:]
+    for j, key in enumerate(df.keys()):
         # remove NaNs
         idx_nan = np.isnan(df[key])
-        dates = [df.index[_] for _ in np.where(~idx_nan)[0]]
-        tide = tides.tide.to_numpy()[~idx_nan]
+        dates = df.index[~idx_nan.to_numpy()]
         composite = df[key][~idx_nan]
-        # apply tidal correction
-        tsall = SDS_slope.tide_correct(composite,tide,beach_slopes)
-        title = 'Transect %s'%key
-        SDS_slope.plot_spectrum_all(dates,composite,tsall,settings_slope, title)
-        slope_est[key],cis[key] = SDS_slope.integrate_power_spectrum(dates,tsall,settings_slope)
+        tsall = tsall_all[~idx_nan.to_numpy(),j,:].T
+        if PLOT:
+            SDS_slope.plot_spectrum_all(dates,composite,tsall,settings_slope, 'Transect %s'%key)
+        slope_est[key],cis[key] = integrate_power_spectrum(dates,tsall,settings_slope)
         print('Beach slope at transect %s: %.3f'%(key, slope_est[key]))
     transects.beach_slope.update(slope_est)
     transects.cil.update({k: v[0] for k,v in cis.items()})
@@ -1,13 +1,17 @@
 %reload_ext autotime
+import numpy as np
 import pandas as pd
 import requests
+import httpx
+import asyncio
+import diskcache
 import geopandas as gpd
 from tqdm.auto import tqdm
 from tqdm.contrib.concurrent import process_map
-import time
+from tqdm.asyncio import tqdm_asyncio
 import os
 from glob import glob
-from coastsat import SDS_transects
+from numba import njit, prange
 import json
 import matplotlib.pyplot as plt
 import dotenv
@@ -1,5 +1,12 @@
+def round_10min(dates):
+    # same as dates.dt.round("10min") (halves go to even), done on the int64 nanoseconds
+    step = 600 * 10**9
+    q, r = np.divmod(dates.dt.as_unit("ns").astype("int64").to_numpy(), step)
+    q += (r > step // 2) | ((r == step // 2) & (q % 2 == 1))
+    return pd.Series(pd.to_datetime(q * step, utc=True), index=dates.index, name=dates.name)
+
 sitename = "nzd0001"
-dates = pd.to_datetime(pd.read_csv(f"data/{sitename}/transect_time_series.csv").dates).dt.round("10min")
+dates = round_10min(pd.read_csv(f"data/{sitename}/transect_time_series.csv", engine="pyarrow", usecols=["dates"], parse_dates=["dates"]).dates)
 point = poly.geometry[sitename].centroid
 datetime = dates.iloc[0]
 print(datetime, point)
@@ -13,6 +20,6 @@ r = requests.get("https://api.niwa.co.nz/tides/data", params={
     "apikey": os.environ["NIWA_API_KEY"]
 }, timeout=(30,30))
 df = pd.DataFrame(r.json()["values"])
-df.index = pd.to_datetime(df.time)
+df.index = pd.to_datetime(df.time, format="ISO8601")
 ax = df.plot(style="o-")
 df[df.index == datetime].plot(color="red", style="x", ax=ax, mew=2, ms=10)
\ No newline at end of file
@@ -1,40 +1,59 @@
-def get_tide_for_dt(point, datetime):
-    while True:
-        try:
-            r = requests.get("https://api.niwa.co.nz/tides/data", params={
-                "lat": point.y,
-                "long": point.x,
-                "numberOfDays": 2,
-                "startDate": str(datetime.date()),
-                "datum": "MSL",
-                "interval": 10, # 10 minute resolution
-                "apikey": os.environ["NIWA_API_KEY"]
-            }, timeout=(30,30))
-        except Exception as e:
-            print(e)
-            time.sleep(5)
-            continue
-        if r.status_code == 200:
-            df = pd.DataFrame(r.json()["values"])
-            df.index = pd.to_datetime(df.time)
-            return df.value[datetime]
-        elif r.status_code == 429:
-            sleep_seconds = 30
-            # sleep for x seconds to refresh the count
-            print(f'Num of API reqs exceeded, Sleeping for: {sleep_seconds} seconds...')
-            time.sleep(sleep_seconds)
+async def fetch_tides_for_day(client, semaphore, point, day):
+    params = {
+        "lat": point.y,
+        "long": point.x,
+        "numberOfDays": 2,
+        "startDate": str(day.date()),
+        "datum": "MSL",
+        "interval": 10, # 10 minute resolution
+        "apikey": os.environ["NIWA_API_KEY"]
+    }
+    sleep_seconds = 30
+    async with semaphore:
+        while True:
+            try:
+                r = await client.get("https://api.niwa.co.nz/tides/data", params=params)
+            except httpx.HTTPError as e:
+                print(e)
+                await asyncio.sleep(5)
+                continue
+            if r.status_code == 200:
+                df = pd.DataFrame(r.json()["values"])
+                return pd.Series(df.value.to_numpy(), index=pd.to_datetime(df.time, format="ISO8601"))
+            elif r.status_code == 429:
+                # back off to let the request count refresh
+                print(f'Num of API reqs exceeded, Sleeping for: {sleep_seconds} seconds...')
+                await asyncio.sleep(sleep_seconds)
+                sleep_seconds = min(2 * sleep_seconds, 300)
+            else:
+                await asyncio.sleep(5)
+
+def tide_cache_key(point, day):
+    return (round(point.y, 3), round(point.x, 3), str(day.date()))
+
+async def fetch_tides(point, dates, concurrency=10):
+    # one request per calendar day, shared by all the dates that fall on it;
+    # days already fetched for this location are read back from the on-disk cache, kept
+    # outside the repository so that the auto-update commit does not pick it up
+    days = dates.dt.floor("D").unique()
+    with diskcache.Cache(os.path.expanduser("~/.cache/niwa_tides")) as cache:
+        by_day = {day: cache.get(tide_cache_key(point, day)) for day in days}
+        missing = [day for day, values in by_day.items() if values is None]
+        if missing:
+            semaphore = asyncio.Semaphore(concurrency)
+            async with httpx.AsyncClient(timeout=30) as client:
+                fetched = await tqdm_asyncio.gather(*(fetch_tides_for_day(client, semaphore, point, day) for day in missing))
+            for day, values in zip(missing, fetched):
+                cache.set(tide_cache_key(point, day), values)
+                by_day[day] = values
+    values = pd.concat(by_day.values())
+    values = values[~values.index.duplicated()]
+    return values.reindex(dates).rename("tide").rename_axis("dates")
 
 for sitename in tqdm(files[~files.have_tides].sitename):
-    dates = pd.to_datetime(pd.read_csv(f"data/{sitename}/transect_time_series.csv").dates).dt.round("10min")
+    dates = round_10min(pd.read_csv(f"data/{sitename}/transect_time_series.csv", engine="pyarrow", usecols=["dates"], parse_dates=["dates"]).dates)
     point = poly.geometry[sitename].centroid
 
-    results = []
-    for date in tqdm(dates):
-        result = get_tide_for_dt(point, date)
-        results.append({
-            "dates": date,
-            "tide": result
-        })
-    df = pd.DataFrame(results)
-    df.set_index("dates", inplace=True)
-    df.to_csv(f"data/{sitename}/tides.csv")
\ No newline at end of file
+    df = (await fetch_tides(point, dates)).to_frame()
+    # acquisitions that round to the same 10 minutes share one row
+    df[~df.index.duplicated()].to_csv(f"data/{sitename}/tides.csv")
\ No newline at end of file
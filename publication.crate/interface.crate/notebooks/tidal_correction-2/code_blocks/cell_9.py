@@ -1,40 +1,87 @@
-def despike(chainage, threshold=40):
-    chainage = chainage.dropna()
-    chainage, dates = SDS_transects.identify_outliers(chainage.tolist(), chainage.index.tolist(), threshold)
-    return pd.Series(chainage, index=dates)
+@njit
+def despike_chainage(chainage, cross_change):
+    # port of SDS_transects.identify_outliers, returns a mask of the points to keep
+    keep = ~np.isnan(chainage)
+    rows = np.flatnonzero(keep)
+    values = chainage[rows]
+    n = len(values)
+    k = 0
+    while k < n and n > 1:
+        for k in range(n):
+            outlier = False
+            if k == 0:
+                outlier = abs(values[k] - values[k + 1]) > cross_change
+            elif k == n - 1:
+                outlier = abs(values[k] - values[k - 1]) > cross_change
+            else:
+                diff_m1 = values[k] - values[k - 1]
+                diff_p1 = values[k] - values[k + 1]
+                condition1 = abs(diff_m1) > cross_change
+                condition2 = abs(diff_p1) > cross_change
+                condition3 = np.sign(diff_p1) == np.sign(diff_m1)
+                outlier = condition1 and condition2 and condition3
+                if not outlier and k >= 2 and k < n - 2:
+                    diff_m2 = values[k - 1] - values[k - 2]
+                    diff_p2 = values[k + 1] - values[k + 2]
+                    condition4 = abs(diff_m2) > cross_change
+                    condition5 = abs(diff_p2) > cross_change
+                    condition6 = np.sign(diff_m1) == np.sign(diff_p2)
+                    condition7 = np.sign(diff_p1) == np.sign(diff_m2)
+                    if condition1 and condition5 and condition6:
+                        outlier = True
+                    elif condition2 and condition4 and condition7:
+                        outlier = True
+                    else:
+                        condition4b = abs(diff_m2) > 1.5 * cross_change
+                        condition5b = abs(diff_p2) > 1.5 * cross_change
+                        condition8 = np.sign(diff_m2) == np.sign(diff_p2)
+                        outlier = (
+                            condition4b and condition5b and not condition1 and not condition2 and condition8
+                        )
+            if outlier:
+                keep[rows[k]] = False
+                rows[k : n - 1] = rows[k + 1 : n]
+                values[k : n - 1] = values[k + 1 : n]
+                n -= 1
+                break
+        k = k + 1
+    return keep
 
-def process_sitename(sitename):
-    transects_at_site = transects[transects.site_id == sitename]
+@njit(parallel=True)
+def despike_columns(chainages, cross_change):
+    keep = np.empty(chainages.shape, dtype=np.bool_)
+    for j in prange(chainages.shape[1]):
+        keep[:, j] = despike_chainage(chainages[:, j], cross_change)
+    return keep
+
+def despike(df, threshold=40):
+    keep = despike_columns(np.asfortranarray(df.to_numpy(dtype=np.float64)), threshold)
+    return df.where(keep)[keep.any(axis=1)]
+
+transects_by_site = dict(list(transects.groupby("site_id")))
+
+def process_sitename(sitename, transects_at_site):
     assert len(transects_at_site)
-    raw_intersects = pd.read_csv(f"data/{sitename}/transect_time_series.csv")#.drop(columns=["Unnamed: 0"])
-    sat_times = pd.to_datetime(raw_intersects.dates).dt.round("10min")
+    raw_intersects = pd.read_csv(f"data/{sitename}/transect_time_series.csv", engine="pyarrow", parse_dates=["dates"], dtype={"satname": "category"})#.drop(columns=["Unnamed: 0"])
+    sat_times = round_10min(raw_intersects.dates)
     raw_intersects.set_index("dates", inplace=True)
-    raw_intersects.index = pd.to_datetime(raw_intersects.index)
-    tides = pd.read_csv(f"data/{sitename}/tides.csv")
-    tides.set_index("dates", inplace=True)
-    tides.index = pd.to_datetime(tides.index)
-    tides = tides[tides.index.isin(sat_times)]
-    if not all(sat_times.isin(tides.index)):
-        dates = sat_times[~sat_times.isin(tides.index)]
+    tides = pd.read_csv(f"data/{sitename}/tides.csv", engine="pyarrow", parse_dates=["dates"], index_col="dates")
+    # older tides.csv files repeat the slots shared by several acquisitions
+    tides = tides[~tides.index.duplicated()]
+    slots = sat_times.drop_duplicates()
+    tides = tides.reindex(slots)
+    missing = tides.tide.isna().to_numpy()
+    if missing.any():
+        dates = slots[missing]
         print(f"Fetching missing tides for {len(dates)} dates at {sitename}")
         point = poly.geometry[sitename].centroid
-        results = []
-        for date in tqdm(dates):
-            result = get_tide_for_dt(point, date)
-            results.append({
-                "dates": date,
-                "tide": result
-            })
-        new_tides = pd.DataFrame(results)
-        new_tides.dates = pd.to_datetime(new_tides.dates)
-        new_tides.set_index("dates", inplace=True)
-        tides = pd.concat([tides, new_tides])
-        tides.sort_index(inplace=True)
-        tides.to_csv(f"data/{sitename}/tides.csv")
-    corrections = tides.tide.apply(lambda tide: tide / transects_at_site.beach_slope.interpolate().bfill().ffill()).set_index(raw_intersects.index)
-    corrections.columns = corrections.columns.astype(str)
+        tides.loc[missing, "tide"] = asyncio.run(fetch_tides(point, dates)).to_numpy()
+        tides.sort_index().to_csv(f"data/{sitename}/tides.csv")
+    tide = tides.tide.reindex(sat_times).to_numpy()
+    slopes = transects_at_site.beach_slope.interpolate().bfill().ffill().to_numpy()
+    corrections = pd.DataFrame(np.divide.outer(tide, slopes), index=raw_intersects.index, columns=transects_at_site.index.astype(str))
     tidally_corrected = raw_intersects + corrections
-    tidally_corrected = tidally_corrected.drop(columns="satname").apply(despike, axis=0)
+    tidally_corrected = despike(tidally_corrected.drop(columns="satname"))
     tidally_corrected.index.name = "dates"
     if len(tidally_corrected) == 0:
         print(f"Despike removed all points for {sitename}")
@@ -42,5 +89,5 @@ def process_sitename(sitename):
     tidally_corrected.to_csv(f"data/{sitename}/transect_time_series_tidally_corrected.csv")
     return tidally_corrected
 
-_ = process_map(process_sitename, files.sitename)
-#process_sitename("nzd0562")
\ No newline at end of file
+_ = process_map(process_sitename, files.sitename, [transects_by_site[sitename] for sitename in files.sitename])
+#process_sitename("nzd0562", transects_by_site["nzd0562"])
\ No newline at end of file
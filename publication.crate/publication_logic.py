@@ -1,44 +1,107 @@
-from rocrate.rocrate import ROCrate
-from rocrate.model.contextentity import ContextEntity
 import tempfile
 import shutil
 import subprocess
-import argparse
 from pathlib import Path
 import json
 import os
-import requests
+import functools
+import hashlib
+import time
+import weakref
+import sys
 import re
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+# tmpfs for the Stencila intermediates when the platform has one, otherwise the default temp directory
+INTERMEDIATE_DIR = "/dev/shm" if os.path.isdir("/dev/shm") and os.access("/dev/shm", os.W_OK) else None
+
+def load_json(path):
+    """Parse a JSON file, with orjson when it is installed."""
+    with open(path, "rb") as f:
+        data = f.read()
+    if ORJSON_AVAILABLE:
+        return orjson.loads(data)
+    return json.loads(data)
+
+GITHUB_BLOB_RE = re.compile(r"https://github\.com/(.+)/blob/([a-f0-9]+)/(.+)")
+
+def dump_json(path, obj):
+    """Write obj to path as UTF-8 JSON indented by two spaces, with orjson when it is installed."""
+    if ORJSON_AVAILABLE:
+        with open(path, "wb") as f:
+            f.write(orjson.dumps(obj, option=orjson.OPT_INDENT_2))
+        return
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(obj, f, ensure_ascii=False, indent=2)
 
 def convert_to_raw_url(github_url: str) -> str:
     """
     Converts a GitHub blob URL to a raw.githubusercontent URL.
     """
-    match = re.match(r"https://github\.com/(.+)/blob/([a-f0-9]+)/(.+)", github_url)
+    match = GITHUB_BLOB_RE.match(github_url)
     if not match:
         raise ValueError("Invalid GitHub blob URL format.")
     user_repo, commit_hash, path = match.groups()
     return f"https://raw.githubusercontent.com/{user_repo}/{commit_hash}/{path}"
 
+def _linked_ids(e, prop, is_rocrate):
+    val = (e.properties().get(prop) if is_rocrate else e.get(prop))
+    if val is None:
+        return []
+    vals = [val] if not isinstance(val, list) else val
+
+    return [
+        (x.id if hasattr(x, "id") else x.get("@id") if isinstance(x, dict) else x)
+        for x in vals
+    ]
+
+# Per-crate {prop: (entities, {linked id: [entity positions]})}, built on first query of each prop
+_LINK_INDEXES = weakref.WeakKeyDictionary()
+
+def build_link_index(crate, prop):
+    """
+    Index the entities of an ROCrate by the ids their `prop` links to, in graph order.
+    The index is kept for as long as the crate object lives, so the crate must not be modified afterwards.
+    """
+    indexes = _LINK_INDEXES.setdefault(crate, {})
+    if prop not in indexes:
+        entities = list(crate.get_entities())
+        links = {}
+        for position, e in enumerate(entities):
+            for _id in dict.fromkeys(_linked_ids(e, prop, True)):
+                links.setdefault(_id, []).append(position)
+        indexes[prop] = (entities, links)
+    return indexes[prop]
+
 def query_by_link(crate, prop, target_id, match_substring=False):
     """
     Return entities (dict or ContextEntity) whose `prop` links to `target_id`.
     If `match_substring` is True, will return entities whose link includes `target_id` as a substring.
     """
     is_rocrate = hasattr(crate, "get_entities")
-    entities = crate.get_entities() if is_rocrate else crate.get("@graph", [])
-    out = []
+    if is_rocrate:
+        entities, links = build_link_index(crate, prop)
+        if not match_substring:
+            return [entities[i] for i in links.get(target_id, [])]
+        if target_id is None:
+            return []
+        positions = set()
+        for _id, matches in links.items():
+            if isinstance(_id, str) and target_id in _id:
+                positions.update(matches)
+        return [entities[i] for i in sorted(positions)]
 
-    for e in entities:
-        val = (e.properties().get(prop) if is_rocrate else e.get(prop))
-        if val is None:
+    out = []
+    for e in crate.get("@graph", []):
+        ids = _linked_ids(e, prop, False)
+        if not ids:
             continue
-        vals = [val] if not isinstance(val, list) else val
-
-        ids = [
-            (x.id if hasattr(x, "id") else x.get("@id") if isinstance(x, dict) else x)
-            for x in vals
-        ]
         if match_substring:
             if any(target_id in _id for _id in ids if _id is not None and isinstance(_id, str) and target_id is not None):
                 out.append(e)
@@ -47,9 +110,131 @@ def query_by_link(crate, prop, target_id, match_substring=False):
                 out.append(e)
     return out
 
+def load_crate(crate_path):
+    """
+    Return the ROCrate at crate_path, parsed once per process for as long as its manifest is unchanged.
+    """
+    crate_path = Path(crate_path).resolve()
+    stat = os.stat(crate_path / "ro-crate-metadata.json")
+    return _load_crate(str(crate_path), stat.st_mtime_ns, stat.st_size)
+
+@functools.lru_cache(maxsize=16)
+def _load_crate(crate_path, mtime_ns, size):
+    from rocrate.rocrate import ROCrate
+    return ROCrate(crate_path)
+
+# Downloaded data files are revalidated against their source at most this often, in seconds
+CACHE_REVALIDATE_AFTER = 3600
+
+DOWNLOAD_CHUNK_SIZE = 256 * 1024
+
+def cache_meta_path(cache_path):
+    return cache_path.with_name(cache_path.name + ".meta.json")
+
+def read_cache_meta(cache_path):
+    try:
+        return load_json(cache_meta_path(cache_path))
+    except (OSError, ValueError):
+        return {}
+
+def write_cache_meta(cache_path, meta):
+    meta_path = cache_meta_path(cache_path)
+    partial_path = meta_path.with_name(meta_path.name + ".part")
+    dump_json(partial_path, meta)
+    os.replace(partial_path, meta_path)
+
+def cache_is_current(cache_path):
+    """
+    True if cache_path can be used without asking the server. Files shipped without a sidecar are
+    trusted as they are; downloaded ones are revalidated once CACHE_REVALIDATE_AFTER has passed.
+    """
+    if not cache_path.exists():
+        return False
+    meta = read_cache_meta(cache_path)
+    if not meta:
+        return True
+    return time.time() - meta.get("checked", 0) < CACHE_REVALIDATE_AFTER
+
+def conditional_get(url, cache_path, headers=None, session=None):
+    """
+    Download url to cache_path, sending the ETag/Last-Modified validators of a previous download of
+    the same url so an unchanged file is answered with 304 and not transferred again.
+    Returns True if cache_path was (re)written.
+    """
+    http = session
+    if http is None:
+        import requests
+        http = requests
+    meta = read_cache_meta(cache_path)
+    request_headers = dict(headers or {})
+    if cache_path.exists() and meta.get("url") == url:
+        if meta.get("etag"):
+            request_headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            request_headers["If-Modified-Since"] = meta["last_modified"]
+
+    with http.get(url, headers=request_headers, stream=True) as response:
+        if response.status_code == 304:
+            meta["checked"] = time.time()
+            write_cache_meta(cache_path, meta)
+            return False
+        response.raise_for_status()
+
+        # Stream to a partial file and swap it in, so memory stays flat and an interrupted
+        # download never replaces a good cached copy
+        partial_path = cache_path.with_name(cache_path.name + ".part")
+        try:
+            written = 0
+            with open(partial_path, "wb") as f:
+                for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                    written += f.write(chunk)
+            # Content-Length counts the encoded bytes, so it can only be checked for identity responses
+            expected = response.headers.get("Content-Length")
+            if expected is not None and not response.headers.get("Content-Encoding") and written != int(expected):
+                raise IOError(f"Incomplete download of {url}: got {written} of {expected} bytes")
+            os.replace(partial_path, cache_path)
+        except BaseException:
+            partial_path.unlink(missing_ok=True)
+            raise
+    write_cache_meta(cache_path, {
+        "url": url,
+        "etag": response.headers.get("ETag"),
+        "last_modified": response.headers.get("Last-Modified"),
+        "checked": time.time(),
+    })
+    return True
+
+def download_session(headers=None):
+    """
+    A requests.Session that keeps HTTPS connections alive between downloads and retries
+    transient gateway errors with backoff.
+    """
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+
+    session = requests.Session()
+    session.headers.update(headers or {})
+    retries = Retry(total=3, backoff_factor=0.5, status_forcelist=(502, 503, 504))
+    session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=8, max_retries=retries))
+    return session
+
+def cache_data_file(label, cache_path, resolve_url, session):
+    """
+    Download or revalidate cache_path from the URL returned by resolve_url (a GitHub blob link).
+    """
+    print(f"Downloading {label}...")
+    try:
+        if conditional_get(convert_to_raw_url(resolve_url()), cache_path, session=session):
+            print(f"Cached {label} to {cache_path}")
+        else:
+            print(f"Cached {label} is up to date: {cache_path}")
+    except Exception as e:
+        print(f"Failed to cache {label}: {e}")
+
 def cache_required_data(crate_root):
     """
-    Cache required data files by downloading them if they don't exist.
+    Cache required data files by downloading them if they don't exist, or revalidating them once stale.
     Returns paths to the cached files.
     """
     cached_files = {}
@@ -69,78 +254,139 @@ def cache_required_data(crate_root):
         if not interface_crate_path.exists():
             print(f"Warning: interface.crate not found at {interface_crate_path}")
             return cached_files
-            
-        interface_crate = ROCrate(interface_crate_path)
-        batch_processes_crate = ROCrate(batch_processes_crate_path)
-        
-        # Cache shoreline data
-        shoreline_cache_path = crate_root / "cached_shoreline.geojson"
-        if not shoreline_cache_path.exists():
-            print("Downloading shoreline data...")
-            try:
-                shoreline_entity = query_by_link(batch_processes_crate, "@id", "shorelines.geojson", match_substring=True)[0]
-                shoreline_url = shoreline_entity.get("@id")
-                response = requests.get(convert_to_raw_url(shoreline_url), headers=headers)
-                response.raise_for_status()
-                
-                with open(shoreline_cache_path, "wb") as f:
-                    f.write(response.content)
-                print(f"Cached shoreline data to {shoreline_cache_path}")
-            except Exception as e:
-                print(f"Failed to cache shoreline data: {e}")
-        else:
-            print(f"Using existing cached shoreline data: {shoreline_cache_path}")
-        
-        cached_files['shoreline'] = shoreline_cache_path
-        
-        # Cache primary result data (transects_extended)
-        primary_result_cache_path = crate_root / "cached_primary_result.geojson"
-        if not primary_result_cache_path.exists():
-            print("Downloading primary result data...")
-            try:
-                primary_result = query_by_link(interface_crate, "exampleOfWork", "#fp-transectsextended-3")[0]
-                primary_result_url = primary_result.get("@id")
-                response = requests.get(convert_to_raw_url(primary_result_url), headers=headers)
-                response.raise_for_status()
-                
-                with open(primary_result_cache_path, "wb") as f:
-                    f.write(response.content)
-                print(f"Cached primary result data to {primary_result_cache_path}")
-            except Exception as e:
-                print(f"Failed to cache primary result data: {e}")
-        else:
-            print(f"Using existing cached primary result data: {primary_result_cache_path}")
-        
-        cached_files['primary_result'] = primary_result_cache_path
+
+        def shoreline_url():
+            batch_processes_crate = load_crate(batch_processes_crate_path)
+            return query_by_link(batch_processes_crate, "@id", "shorelines.geojson", match_substring=True)[0].get("@id")
+
+        def primary_result_url():
+            interface_crate = load_crate(interface_crate_path)
+            return query_by_link(interface_crate, "exampleOfWork", "#fp-transectsextended-3")[0].get("@id")
+
+        # Shoreline data and primary result data (transects_extended), as (key, label, cache path, source url)
+        downloads = [
+            ('shoreline', "shoreline data", crate_root / "cached_shoreline.geojson", shoreline_url),
+            ('primary_result', "primary result data", crate_root / "cached_primary_result.geojson", primary_result_url),
+        ]
+
+        # The downloads are independent, so fetch them concurrently over one connection pool;
+        # a failure is reported per file
+        with download_session(headers) as session, ThreadPoolExecutor(max_workers=4) as executor:
+            for key, label, cache_path, resolve_url in downloads:
+                if cache_is_current(cache_path):
+                    print(f"Using existing cached {label}: {cache_path}")
+                else:
+                    executor.submit(cache_data_file, label, cache_path, resolve_url, session)
+                cached_files[key] = cache_path
         
     except Exception as e:
         print(f"Error in cache_required_data: {e}")
     
     return cached_files
 
-def prepare_temp_directory(template_path, site_id):
+def find_manifests(root, name="ro-crate-metadata.json"):
+    """
+    Yield (path, stat) for every manifest under root, using one scandir pass per directory.
+    Hidden directories are not descended into.
+    """
+    stack = [Path(root)]
+    while stack:
+        directory = stack.pop()
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    if not entry.name.startswith("."):
+                        stack.append(Path(entry.path))
+                elif entry.name == name and entry.is_file():
+                    yield Path(entry.path), entry.stat()
+
+def fast_copy(src, dst):
+    """
+    Copy src to dst with its permission bits, as shutil.copy does, letting the kernel move the bytes
+    with os.copy_file_range (reflinks or server-side copies where the filesystem supports them), and
+    falling back to shutil.copyfile (sendfile on Linux) where it is unavailable.
+    """
+    if hasattr(os, "copy_file_range"):
+        try:
+            with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+                remaining = os.fstat(fsrc.fileno()).st_size
+                while remaining > 0:
+                    copied = os.copy_file_range(fsrc.fileno(), fdst.fileno(), remaining)
+                    if copied == 0:
+                        break
+                    remaining -= copied
+            if remaining == 0:
+                shutil.copymode(src, dst)
+                return
+        except OSError:
+            pass
+    shutil.copyfile(src, dst)
+    shutil.copymode(src, dst)
+
+def link_or_copy(src, dst):
+    """
+    Hard-link dst to src, copying instead where links are unsupported (e.g. a temp dir on another
+    filesystem). Only for files the pipeline reads, since a link shares its contents with src.
+    Also used by crate_builder. Returns True if dst is a link to src.
+    """
+    try:
+        os.link(src, dst)
+        return True
+    except FileExistsError:
+        if os.path.samefile(src, dst):
+            return True
+        os.unlink(dst)
+        return link_or_copy(src, dst)
+    except OSError:
+        fast_copy(src, dst)
+        return False
+
+def copy_if_changed(src, dst, stat=None):
+    """
+    Link or copy src to dst unless dst already has the same size and mtime; returns True if dst was written.
+    Copies go through fast_copy.
+    """
+    stat = stat or os.stat(src)
+    try:
+        existing = os.stat(dst)
+        if existing.st_size == stat.st_size and existing.st_mtime_ns == stat.st_mtime_ns:
+            return False
+    except FileNotFoundError:
+        pass
+    if not link_or_copy(src, dst):
+        os.utime(dst, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    return True
+
+@functools.cache
+def _resolve_crate_root(script_file):
+    """
+    Locate publication.crate relative to script_file, which may live inside the crate, in src/,
+    or in the legacy parent directory.
+    """
+    script_parent = Path(script_file).parent
+    if script_parent.name.endswith("publication.crate"):
+        # Running from inside publication.crate
+        return script_parent
+    if script_parent.name == "src":
+        # Running from src directory (new structure)
+        return script_parent.parent / "publication.crate"
+    # Running from parent directory (legacy)
+    return script_parent / "publication.crate"
+
+def prepare_temp_directory(template_path, site_id, crate_root=None):
     temp_dir = tempfile.TemporaryDirectory()
     temp_dir_path = Path(temp_dir.name)
 
-    shutil.copy(template_path, temp_dir_path / "shoreline_publication.smd")
+    # The template is copied rather than linked, in case it is rewritten in place
+    fast_copy(template_path, temp_dir_path / "shoreline_publication.smd")
     
     # Write the simple site_id data to data.json in the temp directory
     data_json_path = temp_dir_path / "data.json"
     site_data = {"id": site_id}
-    with open(data_json_path, "w", encoding="utf-8") as f:
-        json.dump(site_data, f, ensure_ascii=False, indent=2)
+    dump_json(data_json_path, site_data)
 
-    # Determine the crate root based on where we're running from
-    script_parent = Path(__file__).parent
-    if script_parent.name.endswith("publication.crate"):
-        # Running from inside publication.crate
-        crate_root = script_parent
-    elif script_parent.name == "src":
-        # Running from src directory (new structure)
-        crate_root = script_parent.parent / "publication.crate"
-    else:
-        # Running from parent directory (legacy)
-        crate_root = script_parent / "publication.crate"
+    if crate_root is None:
+        crate_root = _resolve_crate_root(__file__)
     
     # Cache required data files
     print("🔍 Checking and caching required data files...")
@@ -150,16 +396,16 @@ def prepare_temp_directory(template_path, site_id):
     for data_type, cache_path in cached_files.items():
         if cache_path and cache_path.exists():
             if data_type == 'shoreline':
-                shutil.copy(cache_path, temp_dir_path / "cached_shoreline.geojson")
+                link_or_copy(cache_path, temp_dir_path / "cached_shoreline.geojson")
                 print(f"Copied cached shoreline data to temp directory")
             elif data_type == 'primary_result':
-                shutil.copy(cache_path, temp_dir_path / "cached_primary_result.geojson")
+                link_or_copy(cache_path, temp_dir_path / "cached_primary_result.geojson")
                 print(f"Copied cached primary result data to temp directory")
     
     # Copy the narrative zoning script to temp directory
     narrative_zoning_script = crate_root / "narrative_zoning.py"
     if narrative_zoning_script.exists():
-        shutil.copy(narrative_zoning_script, temp_dir_path / "narrative_zoning.py")
+        link_or_copy(narrative_zoning_script, temp_dir_path / "narrative_zoning.py")
         print(f"Copied narrative zoning script to temp directory")
     else:
         print(f"Warning: narrative_zoning.py not found at {narrative_zoning_script}")
@@ -167,30 +413,87 @@ def prepare_temp_directory(template_path, site_id):
     # Copy transects file if available
     transects_file = crate_root / "transects_extended.geojson"
     if transects_file.exists():
-        shutil.copy(transects_file, temp_dir_path / "transects_extended.geojson")
+        link_or_copy(transects_file, temp_dir_path / "transects_extended.geojson")
         print(f"Copied transects file to temp directory")
     else:
         print(f"Warning: transects_extended.geojson not found at {transects_file}")
     
-    # Add top-level ro-crate-metadata.json
-    top_level_manifest = crate_root / "ro-crate-metadata.json"
-    if top_level_manifest.exists():
-        shutil.copy(top_level_manifest, temp_dir_path / "ro-crate-metadata.json")
-
-    # Recursively find and copy all nested ro-crate-metadata.json files
-    for dirpath, dirnames, filenames in os.walk(crate_root):
-        if "ro-crate-metadata.json" in filenames:
-            full_manifest_path = Path(dirpath) / "ro-crate-metadata.json"
-            relative_manifest_path = full_manifest_path.relative_to(crate_root)
-            target_manifest_path = temp_dir_path / relative_manifest_path
-
-            # Ensure parent directories exist
+    # Copy the top-level and all nested ro-crate-metadata.json files in one pass
+    created_dirs = {temp_dir_path}
+    for full_manifest_path, stat in find_manifests(crate_root):
+        relative_manifest_path = full_manifest_path.relative_to(crate_root)
+        target_manifest_path = temp_dir_path / relative_manifest_path
+
+        # Ensure parent directories exist
+        if target_manifest_path.parent not in created_dirs:
             target_manifest_path.parent.mkdir(parents=True, exist_ok=True)
+            created_dirs.add(target_manifest_path.parent)
+        if copy_if_changed(full_manifest_path, target_manifest_path, stat):
             print(f"Copying {full_manifest_path} to {target_manifest_path}")
-            shutil.copy(full_manifest_path, target_manifest_path)
 
     return temp_dir, temp_dir_path
 
+# (python, packages) combinations already known to be importable in this process
+_KERNEL_PACKAGES_READY = set()
+
+def ensure_kernel_packages(packages, python="python", cwd=None):
+    """
+    Install the given packages into the interpreter Stencila's Python kernel runs, skipping pip
+    entirely when they are all importable already. Each combination is only checked once per process.
+    """
+    key = (python, tuple(packages))
+    if key in _KERNEL_PACKAGES_READY:
+        return []
+    # Always ask the kernel's interpreter itself: a venv's python resolves to the same binary as
+    # this one while having its own site-packages
+    probe = "import importlib.util, sys; print(*(p for p in sys.argv[1:] if importlib.util.find_spec(p) is None))"
+    result = subprocess.run([python, "-c", probe, *packages], capture_output=True, text=True, check=True)
+    missing = result.stdout.split()
+    if missing:
+        subprocess.run(
+            [python, "-m", "pip", "install", "--disable-pip-version-check", "-q", *missing],
+            cwd=cwd,
+            check=True
+        )
+    _KERNEL_PACKAGES_READY.add(key)
+    return missing
+
+# Rendered publications, keyed by a digest of everything the Stencila pipeline reads; None disables the cache
+PUBLICATION_CACHE_DIR = Path(os.environ.get("XDG_CACHE_HOME", Path.home() / ".cache")) / "shoreline_publication"
+
+# Number of rendered publications kept; the least recently used ones are removed when a new one is stored
+PUBLICATION_CACHE_MAX_ENTRIES = 32
+
+@functools.lru_cache(maxsize=1)
+def stencila_version():
+    """Output of `stencila --version`, run once per process; "unknown" if it cannot be run."""
+    try:
+        return subprocess.check_output(["stencila", "--version"], text=True).strip()
+    except Exception:
+        return "unknown"
+
+def prune_publication_cache():
+    """Remove all but the PUBLICATION_CACHE_MAX_ENTRIES most recently used rendered publications."""
+    entries = sorted(PUBLICATION_CACHE_DIR.glob("*.html"), key=lambda p: p.stat().st_mtime, reverse=True)
+    for stale in entries[PUBLICATION_CACHE_MAX_ENTRIES:]:
+        stale.unlink(missing_ok=True)
+
+def publication_inputs_digest(temp_dir_path):
+    """
+    Digest of every file in the prepared temp directory (template, data.json, cached data, scripts
+    and manifests), by relative path and content, plus the Stencila version that renders them.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(stencila_version().encode("utf-8") + b"\0")
+    temp_dir_path = Path(temp_dir_path)
+    for path in sorted(p for p in temp_dir_path.rglob("*") if p.is_file()):
+        name = path.relative_to(temp_dir_path).as_posix()
+        digest.update(f"{name}\0{path.stat().st_size}\0".encode("utf-8"))
+        with open(path, "rb") as f:
+            while chunk := f.read(DOWNLOAD_CHUNK_SIZE):
+                digest.update(chunk)
+    return digest.hexdigest()
+
 def evaluate_shorelinepublication(temp_dir_path):
     smd_files = list(temp_dir_path.glob("*.smd"))
     if not smd_files:
@@ -213,83 +516,95 @@ def evaluate_shorelinepublication(temp_dir_path):
         data_content = f.read()
     print(f"Data.json content: {data_content}")
     
+    final_path = f"{temp_dir_path}/shorelinepublication.html"
+
+    # Reuse the publication rendered from exactly these inputs, if there is one
+    cached_publication = None
+    if PUBLICATION_CACHE_DIR is not None:
+        cached_publication = PUBLICATION_CACHE_DIR / f"{publication_inputs_digest(temp_dir_path)}.html"
+        if cached_publication.exists():
+            print(f"♻️ Inputs unchanged, reusing {cached_publication}")
+            os.utime(cached_publication)  # mark as recently used for prune_publication_cache
+            link_or_copy(cached_publication, final_path)
+            return final_path
+
     # Run the stencila pipeline to generate the shoreline publication
     try:
         print("🧪 Running Stencila pipeline...")
         # Ensure pandas is installed in the subprocess environment
-        subprocess.run(
-            ["python", "-m", "pip", "install", "pandas", "rocrate"],
-            cwd=temp_dir_path,
-            check=True
-        )
-        
-        dnf_json = f"{temp_dir_path}/DNF.json"
-        print(f"Converting {template} to {dnf_json}")
-        subprocess.run(["stencila", "convert", template, dnf_json], check=True)
-        
-        # Debug: Check DNF.json content
-        if os.path.exists(dnf_json):
-            print("✅ DNF.json created successfully")
-            with open(dnf_json, 'r') as f:
-                dnf_content = json.load(f)
-            print(f"DNF content type: {dnf_content.get('type')}")
-            print(f"DNF content length: {len(dnf_content.get('content', []))}")
+        ensure_kernel_packages(("pandas", "rocrate"), cwd=temp_dir_path)
         
-        dnf_eval_json = f"{temp_dir_path}/DNF_eval.json"
-        print(f"Rendering {dnf_json} to {dnf_eval_json}")
-        subprocess.run(["stencila", "render", dnf_json, dnf_eval_json, "--force-all", "--pretty", "--", f"--dir={temp_dir_path}"], check=True)
+        # The DNF intermediates are only read back by the next step, so keep them in memory-backed scratch space
+        with tempfile.TemporaryDirectory(dir=INTERMEDIATE_DIR, prefix="dnf-") as scratch_dir:
+            dnf_json = f"{scratch_dir}/DNF.json"
+            print(f"Converting {template} to {dnf_json}")
+            subprocess.run(["stencila", "convert", template, dnf_json], check=True)
+            
+            # Debug: Check DNF.json content
+            if os.path.exists(dnf_json):
+                print("✅ DNF.json created successfully")
+                dnf_content = load_json(dnf_json)
+                print(f"DNF content type: {dnf_content.get('type')}")
+                print(f"DNF content length: {len(dnf_content.get('content', []))}")
+            
+            dnf_eval_json = f"{scratch_dir}/DNF_eval.json"
+            print(f"Rendering {dnf_json} to {dnf_eval_json}")
+            # DNF_eval.json is only read back by the final convert, so it is written compact
+            subprocess.run(["stencila", "render", dnf_json, dnf_eval_json, "--force-all", "--", f"--dir={temp_dir_path}"], check=True)
 
-        final_path = f"{temp_dir_path}/shorelinepublication.html"
-        print(f"Converting {dnf_eval_json} to {final_path}")
-        subprocess.run(["stencila", "convert", dnf_eval_json, final_path, "--pretty"], check=True)
+            print(f"Converting {dnf_eval_json} to {final_path}")
+            subprocess.run(["stencila", "convert", dnf_eval_json, final_path, "--pretty"], check=True)
         
-        return final_path if os.path.exists(final_path) else None
+        if not os.path.exists(final_path):
+            return None
+        if cached_publication is not None:
+            try:
+                PUBLICATION_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+                partial_path = cached_publication.with_name(cached_publication.name + f".{os.getpid()}.part")
+                fast_copy(final_path, partial_path)
+                os.replace(partial_path, cached_publication)
+                prune_publication_cache()
+            except OSError as e:
+                print(f"Warning: could not cache the publication: {e}")
+        return final_path
     except subprocess.CalledProcessError as e:
         print(f"❌ Error in Stencila pipeline: {e}")
         return None
 
 def get_template_path(crate_path):
     """
-    Loads the RO-Crate manifest and locates the template file based on type.
+    Scans the RO-Crate manifest's @graph and locates the template file based on type.
+    The crate is only read here, so it is not loaded into an ROCrate.
     """
-    crate = ROCrate(crate_path)
-    for entity in crate.get_entities():
-        entity_type = entity.properties().get("@type", [])
+    manifest = load_json(Path(crate_path) / "ro-crate-metadata.json")
+    for entity in manifest.get("@graph", []):
+        entity_type = entity.get("@type", [])
         if isinstance(entity_type, str):
             entity_type = [entity_type]
         if all(t in entity_type for t in ["File", "SoftwareSourceCode", "SoftwareApplication"]):
-            return Path(crate_path) / entity.id
+            return Path(crate_path) / entity["@id"]
     raise FileNotFoundError("Template with specified type not found in publication.crate")
 
-if __name__ == "__main__":
+def main(argv=None):
+    """Command-line entry point; argv defaults to sys.argv[1:]."""
+    import argparse
+
     parser = argparse.ArgumentParser(description="Generate a shoreline publication for a given site ID.")
     parser.add_argument("site_id", help="The site ID to generate the shoreline publication for.")
     parser.add_argument("--output", help="Output file path for the generated shoreline publication HTML.", default="shorelinepublication.html")
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
 
     print("🔍 Getting template path...")
     
-    # Detect if we're running from inside publication.crate or from src directory
-    current_dir = Path(__file__).parent
-    if current_dir.name.endswith("publication.crate"):
-        # Running from inside publication.crate
-        crate_path = current_dir
-        print(f"📁 Running from inside publication.crate: {crate_path}")
-    elif current_dir.name == "src":
-        # Running from src directory (new structure)
-        crate_path = current_dir.parent / "publication.crate"
-        print(f"📁 Running from src directory, using: {crate_path}")
-    else:
-        # Running from parent directory (legacy)
-        crate_path = current_dir / "publication.crate"
-        print(f"📁 Running from parent directory, using: {crate_path}")
+    crate_path = _resolve_crate_root(__file__)
+    print(f"📁 Using publication.crate: {crate_path}")
     
     template_path = get_template_path(crate_path)
     print(f"Template path: {template_path}")
 
     print(f"🔍 Preparing publication for site ID: {args.site_id}")
 
-    temp_dir_obj, temp_dir_path = prepare_temp_directory(template_path, args.site_id)
+    temp_dir_obj, temp_dir_path = prepare_temp_directory(template_path, args.site_id, crate_path)
     publication_path = evaluate_shorelinepublication(temp_dir_path)
     if publication_path:
         output_path = args.output if hasattr(args, "output") else "shorelinepublication.html"
@@ -300,3 +615,6 @@ if __name__ == "__main__":
 
     temp_dir_obj.cleanup()  # Clean up the temporary directory
     print("Temporary directory cleaned up.")
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -11,8 +11,7 @@ from pathlib import Path
 src_dir = Path(__file__).parent / "src"
 sys.path.insert(0, str(src_dir))
 
-# Import and run the main publication logic
+# Import and run the main publication logic in this interpreter
 if __name__ == "__main__":
-    import subprocess
-    result = subprocess.run([sys.executable, str(src_dir / "publication_logic.py")] + sys.argv[1:])
-    sys.exit(result.returncode)
+    from publication_logic import main
+    sys.exit(main(sys.argv[1:]))
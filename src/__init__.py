@@ -7,5 +7,16 @@ A dynamic publication system for CoastSat shoreline analysis data.
 __version__ = "1.0.0"
 __author__ = "CoastSat Team"
 
-from .publication_logic import *
-from .crate_builder import *
+import importlib
+
+# The publication pipeline is a script entry point; import it explicitly as src.publication_logic.
+# The crate builder helpers are re-exported lazily, so importing the package does not load rocrate.
+
+def __getattr__(name):
+    if name.startswith("_"):
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    crate_builder = importlib.import_module(".crate_builder", __name__)
+    try:
+        return getattr(crate_builder, name)
+    except AttributeError:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}") from None
@@ -1,20 +1,76 @@
 
 
-from rocrate.rocrate import ROCrate, ContextEntity, Dataset
-from rocrate.model.person import Person
 from pathlib import Path
 import shutil
 
-import subprocess
-import requests
-import zipfile
 import os
-import io
+import json
 import re
 import shutil
 import hashlib
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from .publication_logic import link_or_copy, stencila_version
+except ImportError:
+    # Run as a script (python src/crate_builder.py) rather than as part of the src package
+    from publication_logic import link_or_copy, stencila_version
+
+VERSION_RE = re.compile(r"(\d+\.\d+\.\d+)")
+
+APACHE_LICENSE = "https://www.apache.org/licenses/LICENSE-2.0"
+
+GITHUB_HEADERS = {
+    "Accept": "application/vnd.github.v3+json",
+    "User-Agent": "CoastSat-ShorelinePublication"
+}
+
+# Digest recorded on the File entities: "sha256" (default, for provenance) or "xxh3" for a much
+# faster non-cryptographic xxh3_128 fingerprint, stored under the "xxh3_128" property (needs xxhash)
+CRATE_HASH = os.environ.get("CRATE_HASH", "sha256")
+
+HASH_PROPERTIES = {"sha256": "sha256", "xxh3": "xxh3_128"}
+
+def hash_property(algorithm=None):
+    """RO-Crate property name the digest of the given (or configured) algorithm is stored under."""
+    algorithm = algorithm or CRATE_HASH
+    if algorithm not in HASH_PROPERTIES:
+        raise ValueError(f"Unsupported CRATE_HASH {algorithm!r}; expected one of {sorted(HASH_PROPERTIES)}")
+    return HASH_PROPERTIES[algorithm]
+
+def new_hash(algorithm=None):
+    if hash_property(algorithm) == "xxh3_128":
+        import xxhash
+        return xxhash.xxh3_128()
+    return hashlib.sha256()
+
+def copy_and_hash(src, dsts, chunk_size=1 << 20, algorithm=None):
+    """
+    Copy src to every path in dsts, as shutil.copy does, and return its hex digest from the same single read.
+    Only the first destination is written; the others are hard links to it where the filesystem allows.
+    """
+    for dst in dsts:
+        if os.path.exists(dst) and os.path.samefile(src, dst):
+            raise shutil.SameFileError(f"{src!r} and {dst!r} are the same file")
+    first, *others = dsts
+    digest = new_hash(algorithm)
+    with open(src, "rb") as f, open(first, "wb") as out:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            digest.update(chunk)
+            out.write(chunk)
+    for dst in others:
+        link_or_copy(first, dst)
+    for dst in dsts:
+        shutil.copymode(src, dst)
+    return digest.hexdigest()
 
 def add_research_article(crate):
+    from rocrate.model.contextentity import ContextEntity
+
     main_article = crate.add(ContextEntity(crate, "#research-article", properties={
         "@type": "ScholarlyArticle",
         "name": "LivePublication: A Dynamic and Reproducible Research Article",
@@ -26,6 +82,8 @@ def add_research_article(crate):
     return main_article
 
 def add_eval_dnf(crate):
+    from rocrate.model.contextentity import ContextEntity
+
     evaluated_document = crate.add(ContextEntity(crate, "#dnf-evaluated-document", properties={
         "@type": ["CreativeWork", "SoftwareSourceCode"],
         "name": "Evaluated DNF Document",
@@ -34,6 +92,8 @@ def add_eval_dnf(crate):
     return evaluated_document
 
 def add_dnf_presentation(crate):
+    from rocrate.model.contextentity import ContextEntity
+
     dnf_presentation_env = crate.add(ContextEntity(crate, "#dnf-presentation-environment", properties={
         "@type": "CreativeWork",
         "name": "DNF Presentation Environment",
@@ -48,10 +108,9 @@ def add_dnf_schema(crate):
     return wrapper
 
 def add_dnf_engine(crate):
-    try:
-        version_output = subprocess.check_output(["stencila", "--version"], text=True).strip()
-    except Exception:
-        version_output = "unknown"
+    from rocrate.model.contextentity import ContextEntity
+
+    version_output = stencila_version()
 
     stencila_software = crate.add(ContextEntity(crate, "#stencila", properties={
         "@type": "SoftwareApplication",
@@ -59,7 +118,7 @@ def add_dnf_engine(crate):
         "description": "The DNF Engine used to resolve the dynamic narrative.",
         "softwareVersion": version_output,
         "url": "https://github.com/stencila/stencila",
-        "license": "https://www.apache.org/licenses/LICENSE-2.0",
+        "license": APACHE_LICENSE,
         "howToUse": "https://github.com/stencila/stencila/blob/main/docs/reference/cli.md",
         "operatingSystem": "all"
     }))
@@ -67,12 +126,11 @@ def add_dnf_engine(crate):
     return stencila_software
 
 def add_dnf_engine_spec(crate):
-    try:
-        version_output = subprocess.check_output(["stencila", "--version"], text=True).strip()
-    except subprocess.CalledProcessError:
-        version_output = "unknown"
+    from rocrate.model.contextentity import ContextEntity
 
-    version_match = re.search(r"(\d+\.\d+\.\d+)", version_output)
+    version_output = stencila_version()
+
+    version_match = VERSION_RE.search(version_output)
     version_tag = f"v{version_match.group(1)}" if version_match else "main"
 
     stencila_spec = crate.add(ContextEntity(crate, "#stencila-schema", properties={
@@ -80,7 +138,7 @@ def add_dnf_engine_spec(crate):
         "name": "Stencila DNF Engine Specification",
         "description": "Specification and JSON Schemas used by the Stencila DNF Engine to validate and interpret dynamic documents.",
         "url": f"https://github.com/stencila/stencila/tree/{version_tag}/schema",
-        "license": "https://www.apache.org/licenses/LICENSE-2.0"
+        "license": APACHE_LICENSE
     }))
 
     return stencila_spec
@@ -88,61 +146,140 @@ def add_dnf_engine_spec(crate):
 def add_dnf_doc(crate):
     # Use the template from the new structure
     template_path = Path(__file__).parent / "templates" / "shoreline_publication.smd"
-    sha256_hash = hashlib.sha256(open(template_path, "rb").read()).hexdigest() if template_path.exists() else ""
     
-    # Copy template to current working directory for ROCrate to find it
+    # Copy template to current working directory for ROCrate to find it,
+    # and to the publication.crate directory, hashing it in the same pass
     working_dir_template = Path("shoreline_publication.smd")
-    shutil.copy(template_path, working_dir_template)
-    
-    # Also copy to the publication.crate directory
     crate_path = Path(crate.source) if crate.source else Path("publication.crate")
     crate_path.mkdir(parents=True, exist_ok=True)
     publication_template = crate_path / "shoreline_publication.smd"
-    shutil.copy(template_path, publication_template)
+    content_hash = copy_and_hash(template_path, [working_dir_template, publication_template])
     
     dnf_file = crate.add_file("shoreline_publication.smd", properties={
         "@type": ["File", "SoftwareSourceCode", "SoftwareApplication"],
         "name": "DNF Document File",
         "description": "The unresolved dynamic narrative document serving as input to the DNF Engine.",
         "encodingFormat": "application/smd",
-        "sha256": sha256_hash
+        hash_property(): content_hash
     })
     return dnf_file
 
-def add_dnf_deps(crate):
+# Where add_dnf_deps keeps the last interface.crate release zip and its ETags
+RELEASE_CACHE_DIR = Path(".cache")
+
+def read_release_cache():
+    try:
+        with open(RELEASE_CACHE_DIR / "interface_release.json", "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def write_release_cache(cache):
+    RELEASE_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    with open(RELEASE_CACHE_DIR / "interface_release.json", "w", encoding="utf-8") as f:
+        json.dump(cache, f, indent=2)
+
+def extract_zip(archive, dest, chunk_size=1 << 20):
+    """Extract archive into dest one member at a time, streaming each file through a bounded buffer."""
+    import zipfile
+
+    root = Path(dest).resolve()
+    with zipfile.ZipFile(archive) as z:
+        for member in z.infolist():
+            target = (root / member.filename).resolve()
+            if target != root and root not in target.parents:
+                raise Exception(f"Refusing to extract {member.filename!r} outside {dest}")
+            if member.is_dir():
+                target.mkdir(parents=True, exist_ok=True)
+                continue
+            target.parent.mkdir(parents=True, exist_ok=True)
+            with z.open(member) as src, open(target, "wb") as dst:
+                shutil.copyfileobj(src, dst, chunk_size)
+
+def fetch_interface_crate(download_dir="publication.crate"):
+    """Download the latest interface.crate release and extract it into download_dir, without touching any crate."""
+    import requests
+
     repo_owner = "GusEllerm"
     repo_name = "CoastSat-interface.crate"
-    download_dir = "publication.crate"
 
     api_url = f"https://api.github.com/repos/{repo_owner}/{repo_name}/releases/latest"
 
     token_path = Path("token.txt")
     token = token_path.read_text().strip() if token_path.exists() else None
 
-    headers = {
-        "Accept": "application/vnd.github.v3+json",
-        "User-Agent": "CoastSat-ShorelinePublication"
-    }
+    headers = dict(GITHUB_HEADERS)
     if token:
         headers["Authorization"] = f"token {token}"
 
     print("📦 Fetching latest interface.crate release...")
     
-    try:
-        response = requests.get(api_url, headers=headers)
-        response.raise_for_status()
-        release = response.json()
-
-        asset = next((a for a in release["assets"] if a["name"].endswith(".zip")), None)
-        if not asset:
-            raise Exception("No zip asset found in the latest release.")
+    # The last downloaded zip and the ETags it was served with, so unchanged releases are not downloaded again
+    cache = read_release_cache()
+    cached_zip = RELEASE_CACHE_DIR / "interface_release.zip"
+    have_zip = cached_zip.exists()
 
-        print(f"⬇️ Downloading: {asset['name']}")
-        zip_response = requests.get(asset["browser_download_url"], headers=headers)
-        zip_response.raise_for_status()
+    # The release tag the extracted interface.crate came from, so an up-to-date copy is not extracted again
+    extracted_dir = Path(download_dir) / "interface.crate"
+    tag_file = extracted_dir / ".release-tag"
+    extracted_tag = tag_file.read_text().strip() if tag_file.exists() else None
 
-        with zipfile.ZipFile(io.BytesIO(zip_response.content)) as z:
-            z.extractall(download_dir)  # Extracts to current working directory  print(f"✅ Extracted to {download_dir}")
+    try:
+        release_headers = dict(headers)
+        if cache.get("release_etag") and (have_zip or extracted_tag == cache.get("tag_name")):
+            release_headers["If-None-Match"] = cache["release_etag"]
+        response = requests.get(api_url, headers=release_headers)
+
+        if response.status_code == 304:
+            release_tag = cache.get("tag_name")
+            if release_tag is not None and release_tag == extracted_tag:
+                print(f"✅ interface.crate is already at {release_tag}")
+                return
+            print("♻️ Latest release unchanged, reusing the cached zip")
+        else:
+            response.raise_for_status()
+            release = response.json()
+            release_tag = release["tag_name"]
+            cache["release_etag"] = response.headers.get("ETag")
+            cache["tag_name"] = release_tag
+
+            if release_tag == extracted_tag:
+                write_release_cache(cache)
+                print(f"✅ interface.crate is already at {release_tag}")
+                return
+
+            asset = next((a for a in release["assets"] if a["name"].endswith(".zip")), None)
+            if not asset:
+                raise Exception("No zip asset found in the latest release.")
+
+            asset_headers = dict(headers)
+            if have_zip and cache.get("asset_url") == asset["browser_download_url"] and cache.get("asset_etag"):
+                asset_headers["If-None-Match"] = cache["asset_etag"]
+
+            print(f"⬇️ Downloading: {asset['name']}")
+            # Stream the asset to disk rather than holding the whole zip in memory
+            with requests.get(asset["browser_download_url"], headers=asset_headers, stream=True) as zip_response:
+                if zip_response.status_code == 304:
+                    print("♻️ Release asset unchanged, reusing the cached zip")
+                else:
+                    zip_response.raise_for_status()
+                    RELEASE_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+                    partial_zip = cached_zip.with_suffix(".zip.part")
+                    with open(partial_zip, "wb") as archive:
+                        for chunk in zip_response.iter_content(chunk_size=1 << 20):
+                            archive.write(chunk)
+                    os.replace(partial_zip, cached_zip)
+                    cache["asset_etag"] = zip_response.headers.get("ETag")
+
+            cache["asset_url"] = asset["browser_download_url"]
+            write_release_cache(cache)
+
+        # Start from an empty directory so files dropped from the release do not linger
+        if extracted_dir.is_dir():
+            shutil.rmtree(extracted_dir)
+        extract_zip(cached_zip, download_dir)
+        if extracted_dir.is_dir() and release_tag is not None:
+            tag_file.write_text(release_tag)
 
     except Exception as e:
         raise Exception(f"Failed to download and extract interface.crate: {e}")
@@ -150,6 +287,28 @@ def add_dnf_deps(crate):
     if not os.path.isdir(download_dir):
         raise Exception(f"{download_dir} directory is missing after extraction.")
 
+@functools.lru_cache(maxsize=1)
+def extracted_dataset_class():
+    """Dataset subclass, built on first use so rocrate is imported lazily, for directories already extracted into the crate."""
+    from rocrate.model.dataset import Dataset
+
+    class ExtractedDataset(Dataset):
+        def write(self, base_path):
+            # Extracted straight into the output crate: every file is already in place, so skip rocrate's copy walk
+            target = Path(base_path) / self.id
+            if self.source is not None and target.is_dir() and target.samefile(self.source):
+                return
+            super().write(base_path)
+
+    return ExtractedDataset
+
+def add_dnf_deps(crate, fetch=True):
+    Dataset = extracted_dataset_class()
+
+    download_dir = "publication.crate"
+    if fetch:
+        fetch_interface_crate(download_dir)
+
     nested = crate.add(Dataset(crate, download_dir + "/interface.crate/", properties={
         "name": "Interface Crate",
         "@type": ["RO-Crate", "Dataset"],
@@ -163,22 +322,20 @@ def add_publication_logic(crate):
     # Copy the publication logic to current working directory and crate directory
     logic_source = Path(__file__).parent / "publication_logic.py"
     
-    # Copy to current working directory for ROCrate to find it
+    # Copy to current working directory for ROCrate to find it,
+    # and to the publication.crate directory, hashing it in the same pass
     working_dir_logic = Path("publication_logic.py")
-    shutil.copy(logic_source, working_dir_logic)
-    
-    # Copy to the publication.crate directory
     crate_path = Path(crate.source) if crate.source else Path("publication.crate")
     crate_path.mkdir(parents=True, exist_ok=True)
     crate_logic_path = crate_path / "publication_logic.py"
-    shutil.copy(logic_source, crate_logic_path)
+    content_hash = copy_and_hash(logic_source, [working_dir_logic, crate_logic_path])
     
     logic_file = crate.add_file("publication_logic.py", properties={
         "@type": ["File", "SoftwareSourceCode"],
         "name": "Publication Logic",
         "description": "Python logic for generating publications from the DNF document.",
         "encodingFormat": "text/x-python",
-        "sha256": hashlib.sha256(open(logic_source, "rb").read()).hexdigest()
+        hash_property(): content_hash
     })
     return logic_file
 
@@ -188,13 +345,10 @@ def add_narrative_zoning_script(crate):
     if not script_source.exists():
         raise FileNotFoundError(f"Narrative zoning script not found: {script_source}")
     
-    # Copy the script to the crate directory
+    # Copy the script to the crate directory, calculating its hash in the same pass
     crate_path = Path(crate.root_dataset.id)
     narrative_script = crate_path / "narrative_zoning.py"
-    shutil.copy(script_source, narrative_script)
-    
-    # Calculate SHA256 hash
-    sha256_hash = hashlib.sha256(open(script_source, "rb").read()).hexdigest()
+    content_hash = copy_and_hash(script_source, [narrative_script])
     
     # Add to crate
     script_file = crate.add_file("narrative_zoning.py", properties={
@@ -203,7 +357,7 @@ def add_narrative_zoning_script(crate):
         "description": "Python script for analyzing shoreline transects and identifying narrative zones with similar characteristics.",
         "encodingFormat": "text/x-python",
         "programmingLanguage": "Python",
-        "sha256": sha256_hash,
+        hash_property(): content_hash,
         "applicationCategory": "Data Analysis",
         "keywords": ["shoreline", "coastal", "narrative", "zoning", "transects", "analysis"]
     })
@@ -213,17 +367,27 @@ def add_narrative_zoning_script(crate):
     return script_file
 
 def create_publication_crate(crate_dir="publication.crate"):
+    from rocrate.rocrate import ROCrate
+    from rocrate.model.person import Person
+
     crate = ROCrate()
     crate.name = "Publication Crate"
     crate.description = "This crate contains the interface.crate and a Stencila DNF document for generating publications."
     creator = crate.add(Person(crate, "#creator", {"name": "Unknown Author"}))
     crate.creator = creator
 
-    # Add relations
-    dnf_document = add_dnf_doc(crate)
-    dnf_engine = add_dnf_engine(crate)
-    dnf_engine_spec = add_dnf_engine_spec(crate)
-    dnf_data_dependencies = add_dnf_deps(crate)
+    # Add relations. The interface.crate download and the Stencila version query run in the
+    # background while the template is copied; entities are only added on this thread, in order.
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        interface_crate = executor.submit(fetch_interface_crate)
+        stencila = executor.submit(stencila_version)
+
+        dnf_document = add_dnf_doc(crate)
+        stencila.result()
+        dnf_engine = add_dnf_engine(crate)
+        dnf_engine_spec = add_dnf_engine_spec(crate)
+        interface_crate.result()
+        dnf_data_dependencies = add_dnf_deps(crate, fetch=False)
     dnf_engine_schema = add_dnf_schema(crate)
     dnf_eval_doc = add_eval_dnf(crate)
     dnf_presentation_env = add_dnf_presentation(crate)
@@ -13,10 +13,17 @@ Output:
 """
 
 import json
+import os
 import sys
 import argparse
+import hashlib
 import math
-from typing import List, Dict, Any, Optional, Union
+import pickle
+import shutil
+import string
+from functools import lru_cache
+from operator import lt, le, gt, ge, eq, ne
+from typing import List, Dict, Any, Optional, Tuple, Union
 from pathlib import Path
 import numpy as np
 
@@ -27,6 +34,18 @@ try:
 except ImportError:
     GEOPANDAS_AVAILABLE = False
 
+try:
+    import ijson
+    IJSON_AVAILABLE = True
+except ImportError:
+    IJSON_AVAILABLE = False
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
 __all__ = ["run_narrative_zoning"]
 def run_narrative_zoning(site_id: str, transects_file: str, min_zone_length: int = 3,  zone_definitions: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
     """
@@ -36,65 +55,151 @@ def run_narrative_zoning(site_id: str, transects_file: str, min_zone_length: int
     return make_json_serializable(result)
 
 
-def make_json_serializable(obj) -> Any:
-    """
-    Convert an object to a JSON-serializable format.
-    
-    Handles common issues like:
-    - NaN values (convert to None/null)
-    - Infinity values (convert to large numbers or None)
-    - Shapely geometries (convert to coordinate lists)
-    - Pandas Series (convert to lists)
-    - NumPy types (convert to Python types)
-    """
-    if obj is None:
+def _serialize_float(obj: float, stack: list) -> Any:
+    if math.isfinite(obj):
+        return obj
+    elif math.isnan(obj):
         return None
-    elif isinstance(obj, (int, str, bool)):
+    else:
+        return 1e308 if obj > 0 else -1e308  # Large but finite numbers
+
+
+def _serialize_passthrough(obj, stack: list) -> Any:
+    return obj
+
+
+def _serialize_dict(obj: dict, stack: list) -> Dict[Any, Any]:
+    # Copy the mapping and queue the values that still need converting; scalars are settled inline
+    out = dict(obj)
+    push = stack.append
+    for key, value in out.items():
+        kind = type(value)
+        if kind is float:
+            if not math.isfinite(value):
+                out[key] = _serialize_float(value, stack)
+        elif kind not in _JSON_PASSTHROUGH_TYPES:
+            push((out, key))
+    return out
+
+
+def _serialize_list(obj, stack: list) -> List[Any]:
+    out = list(obj)
+    push = stack.append
+    for index, value in enumerate(out):
+        kind = type(value)
+        if kind is float:
+            if not math.isfinite(value):
+                out[index] = _serialize_float(value, stack)
+        elif kind not in _JSON_PASSTHROUGH_TYPES:
+            push((out, index))
+    return out
+
+
+def _serialize_ndarray(obj: np.ndarray, stack: list) -> Any:
+    if obj.dtype.kind != 'f' or obj.dtype.itemsize > 8:
+        return _serialize_fallback(obj, stack)
+    # Sanitize float arrays in one vectorized pass instead of checking every element in Python
+    values = obj.astype(np.float64, copy=False)
+    if np.isfinite(values).all():
+        return values.tolist()
+    out = np.where(np.isinf(values), np.copysign(1e308, values), values).astype(object)
+    out[np.isnan(values)] = None
+    return out.tolist()
+
+
+def _serialize_geometry(obj) -> Any:
+    # Convert to simplified coordinate representation
+    try:
+        geo = obj.__geo_interface__
+        if geo['type'] == 'LineString':
+            return {
+                'type': 'LineString',
+                'coordinates': geo['coordinates']
+            }
+        elif geo['type'] == 'Point':
+            return {
+                'type': 'Point', 
+                'coordinates': geo['coordinates']
+            }
+        else:
+            return geo
+    except:
+        return str(obj)
+
+
+def _serialize_fallback(obj, stack: list) -> Any:
+    # Subclasses of the dispatched types and everything else, in the original precedence order
+    if isinstance(obj, (int, str, bool)):
         return obj
     elif isinstance(obj, float):
-        if math.isnan(obj):
-            return None
-        elif math.isinf(obj):
-            return 1e308 if obj > 0 else -1e308  # Large but finite numbers
-        else:
-            return obj
+        return _serialize_float(obj, stack)
     elif isinstance(obj, dict):
-        return {k: make_json_serializable(v) for k, v in obj.items()}
+        return _serialize_dict(obj, stack)
     elif isinstance(obj, (list, tuple)):
-        return [make_json_serializable(item) for item in obj]
+        return _serialize_list(obj, stack)
     elif hasattr(obj, '__geo_interface__'):  # Shapely geometries
-        # Convert to simplified coordinate representation
-        try:
-            geo = obj.__geo_interface__
-            if geo['type'] == 'LineString':
-                return {
-                    'type': 'LineString',
-                    'coordinates': geo['coordinates']
-                }
-            elif geo['type'] == 'Point':
-                return {
-                    'type': 'Point', 
-                    'coordinates': geo['coordinates']
-                }
-            else:
-                return geo
-        except:
-            return str(obj)
+        return _serialize_geometry(obj)
     elif hasattr(obj, 'tolist'):  # NumPy arrays
-        return make_json_serializable(obj.tolist())
+        return _serialize_value(obj.tolist(), stack)
     elif hasattr(obj, 'to_dict'):  # Pandas Series
-        return make_json_serializable(obj.to_dict())
+        return _serialize_value(obj.to_dict(), stack)
     else:
         # Last resort: convert to string
         return str(obj)
 
 
+_JSON_PASSTHROUGH_TYPES = frozenset([str, int, bool, type(None)])
+
+_SERIALIZE_DISPATCH = {
+    dict: _serialize_dict,
+    list: _serialize_list,
+    tuple: _serialize_list,
+    float: _serialize_float,
+    np.float64: _serialize_float,
+    np.ndarray: _serialize_ndarray,
+    str: _serialize_passthrough,
+    int: _serialize_passthrough,
+    bool: _serialize_passthrough,
+    type(None): _serialize_passthrough,
+}
+
+
+def _serialize_value(obj, stack: list) -> Any:
+    return _SERIALIZE_DISPATCH.get(type(obj), _serialize_fallback)(obj, stack)
+
+
+def make_json_serializable(obj) -> Any:
+    """
+    Convert an object to a JSON-serializable format.
+    
+    Handles common issues like:
+    - NaN values (convert to None/null)
+    - Infinity values (convert to large numbers or None)
+    - Shapely geometries (convert to coordinate lists)
+    - Pandas Series (convert to lists)
+    - NumPy types (convert to Python types)
+    
+    Nested containers are walked with an explicit stack rather than recursion, and
+    each value is dispatched on its exact type before the isinstance fallbacks.
+    """
+    root = [obj]
+    stack = [(root, 0)]
+    pop = stack.pop
+    dispatch = _SERIALIZE_DISPATCH.get
+    while stack:
+        container, key = pop()
+        value = container[key]
+        container[key] = dispatch(type(value), _serialize_fallback)(value, stack)
+    return root[0]
+
+
 def get_default_zone_definitions() -> Dict[str, Any]:
     """
     Get the default zone definitions used by the system.
     
     Returns:
-        Dictionary of zone definitions with priority-based classification rules
+        Dictionary of zone definitions with priority-based classification rules,
+        listed in priority order
     """
     return {
         "no_data": {
@@ -163,6 +268,16 @@ def get_default_zone_definitions() -> Dict[str, Any]:
     }
 
 
+_SCALAR_OPERATORS = {
+    "<": lt,
+    "<=": le,
+    ">": gt,
+    ">=": ge,
+    "==": eq,
+    "!=": ne,
+}
+
+
 def evaluate_condition(value: Any, condition: Dict[str, Any]) -> bool:
     """
     Evaluate a single condition against a value.
@@ -185,24 +300,51 @@ def evaluate_condition(value: Any, condition: Dict[str, Any]) -> bool:
         return allow_null
     
     # Handle different operators
-    if operator == "<":
-        return value < threshold
-    elif operator == "<=":
-        return value <= threshold
-    elif operator == ">":
-        return value > threshold
-    elif operator == ">=":
-        return value >= threshold
-    elif operator == "==":
-        return value == threshold
-    elif operator == "!=":
-        return value != threshold
+    compare = _SCALAR_OPERATORS.get(operator)
+    if compare is not None:
+        return compare(value, threshold)
     elif operator == "is_null":
         return False  # value is not None here
     else:
         raise ValueError(f"Unknown operator: {operator}")
 
 
+_ARRAY_OPERATORS = {
+    "<": np.less,
+    "<=": np.less_equal,
+    ">": np.greater,
+    ">=": np.greater_equal,
+    "==": np.equal,
+    "!=": np.not_equal,
+}
+
+
+def _compile_zone_definitions(zone_definitions: Dict[str, Any]) -> Tuple[Tuple[str, str, List[Dict[str, Any]]], ...]:
+    """
+    Sort zone definitions by priority and check their operators, once per classification run.
+    
+    Args:
+        zone_definitions: Dictionary of zone definitions
+        
+    Returns:
+        Tuple of (zone_name, logic, conditions) in priority order (lower number = higher priority)
+    """
+    items = list(zone_definitions.items())
+    priorities = [zone_def.get('priority', 999) for _, zone_def in items]
+    # Definitions are usually written in priority order already; only sort when they are not
+    if any(later < earlier for earlier, later in zip(priorities, priorities[1:])):
+        items.sort(key=lambda x: x[1].get('priority', 999))
+    
+    compiled = []
+    for zone_name, zone_def in items:
+        conditions = zone_def.get('conditions', [])
+        for cond in conditions:
+            if cond['operator'] != 'is_null' and cond['operator'] not in _ARRAY_OPERATORS:
+                raise ValueError(f"Unknown operator: {cond['operator']}")
+        compiled.append((zone_name, zone_def.get('logic', 'AND'), conditions))
+    return tuple(compiled)
+
+
 def classify_transect_zone_custom(transect: Dict[str, Any], zone_definitions: Dict[str, Any]) -> str:
     """
     Classify a transect using custom zone definitions.
@@ -216,17 +358,10 @@ def classify_transect_zone_custom(transect: Dict[str, Any], zone_definitions: Di
     """
     props = transect['properties']
     
-    # Sort zones by priority (lower number = higher priority)
-    sorted_zones = sorted(zone_definitions.items(), key=lambda x: x[1].get('priority', 999))
-    
-    for zone_name, zone_def in sorted_zones:
-        conditions = zone_def.get('conditions', [])
-        
+    for zone_name, logic, conditions in _compile_zone_definitions(zone_definitions):
         # If no conditions, this is a catch-all zone
         if not conditions:
             return zone_name
-            
-        logic = zone_def.get('logic', 'AND')
         
         if logic == 'AND':
             # All conditions must be true
@@ -241,31 +376,166 @@ def classify_transect_zone_custom(transect: Dict[str, Any], zone_definitions: Di
     return "stable"
 
 
-def load_transects_for_site(site_id: str, transects_file: str) -> List[Dict[str, Any]]:
+# Per-file site indexes of parsed transects, so repeated runs on one file skip the full parse.
+# Set to None to disable.
+SITE_INDEX_CACHE_DIR: Optional[Path] = Path(os.environ.get('XDG_CACHE_HOME', Path.home() / '.cache')) / 'narrative_zoning'
+
+# Number of site indexes kept; the least recently used ones are removed when a new one is built
+SITE_INDEX_MAX_ENTRIES = 4
+
+
+def _read_features(transects_file: str, site_id: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Parse the features of a transects GeoJSON file, keeping only site_id's if it is given."""
+    data = None
+    features = None
+    
+    if ORJSON_AVAILABLE and (site_id is None or not IJSON_AVAILABLE):
+        # Every feature is kept (or nothing can stream), so decode the whole file in one call
+        try:
+            with open(transects_file, 'rb') as f:
+                data = orjson.loads(f.read())
+        except orjson.JSONDecodeError:
+            # e.g. NaN literals, which only the stdlib parser below accepts
+            data = None
+    
+    if data is None and IJSON_AVAILABLE:
+        # Stream the features so only the kept ones are held in memory
+        try:
+            with open(transects_file, 'rb') as f:
+                features = [
+                    feature for feature in ijson.items(f, 'features.item', use_float=True)
+                    if site_id is None or feature['properties']['site_id'] == site_id
+                ]
+        except ijson.JSONError:
+            # e.g. NaN literals, which only the full parser below accepts
+            features = None
+    
+    if features is None:
+        if data is None:
+            with open(transects_file, 'r') as f:
+                data = json.load(f)
+        
+        # Filter features by site_id
+        features = [
+            feature for feature in data['features']
+            if site_id is None or feature['properties']['site_id'] == site_id
+        ]
+    
+    return features
+
+
+@lru_cache(maxsize=8)
+def _content_digest(transects_file: str, size: int, mtime_ns: int) -> str:
+    """Hex digest of a file's content, memoised while its size and mtime are unchanged."""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(transects_file, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _prune_site_indexes(keep: Path) -> None:
+    """Remove all but the SITE_INDEX_MAX_ENTRIES most recently used site indexes, always keeping `keep`."""
+    entries = [entry for entry in SITE_INDEX_CACHE_DIR.iterdir() if entry.is_dir() and entry != keep]
+    entries.sort(key=lambda entry: entry.stat().st_mtime, reverse=True)
+    for stale in entries[max(SITE_INDEX_MAX_ENTRIES - 1, 0):]:
+        shutil.rmtree(stale, ignore_errors=True)
+
+
+def _load_site_from_index(site_id: str, transects_file: str) -> List[Dict[str, Any]]:
     """
-    Load and filter transects for a specific site_id.
+    Load one site's transects through the on-disk site index, building the index if it is missing.
+    
+    The index lives under SITE_INDEX_CACHE_DIR, keyed by a digest of the file's content, so copies
+    and links of one file (such as the per-run copy the publication pipeline renders from) share
+    it. The features are bucketed by site in one pass and each bucket is sorted by transect id
+    once, then pickled separately into one blob, so a cache hit only unpickles the requested,
+    already sorted site.
     
     Args:
-        site_id: The site identifier to filter by (e.g., 'aus0001')
+        site_id: The site identifier to load
         transects_file: Path to the transects GeoJSON file
         
     Returns:
-        List of transect features for the specified site
+        List of transect features for the site, sorted by transect id
     """
+    stat = os.stat(transects_file)
+    signature = _content_digest(str(Path(transects_file).resolve()), stat.st_size, stat.st_mtime_ns)
+    cache_dir = SITE_INDEX_CACHE_DIR / signature
+    index_path = cache_dir / 'index.pkl'
+    
     try:
-        with open(transects_file, 'r') as f:
-            data = json.load(f)
-        
-        # Filter features by site_id
-        site_transects = [
-            feature for feature in data['features'] 
-            if feature['properties']['site_id'] == site_id
-        ]
+        with open(index_path, 'rb') as f:
+            index = pickle.load(f)
+        if index['signature'] == signature and index.get('sorted'):
+            os.utime(cache_dir)  # mark as recently used for _prune_site_indexes
+            if site_id not in index['sites']:
+                return []
+            offset, length = index['sites'][site_id]
+            with open(cache_dir / index['blob'], 'rb') as f:
+                f.seek(offset)
+                return pickle.loads(f.read(length))
+    except Exception:
+        pass  # missing, stale or unreadable index: rebuild it below
+    
+    sites = {}
+    for feature in _read_features(transects_file):
+        sites.setdefault(feature['properties']['site_id'], []).append(feature)
+    for features in sites.values():
+        features.sort(key=lambda x: x['properties']['id'])
+    
+    try:
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        blob_name = "sites.pkl"
+        offsets = {}
+        tmp_blob = cache_dir / f"{blob_name}.{os.getpid()}.tmp"
+        with open(tmp_blob, 'wb') as f:
+            for site, features in sites.items():
+                data = pickle.dumps(features, protocol=pickle.HIGHEST_PROTOCOL)
+                offsets[site] = (f.tell(), len(data))
+                f.write(data)
+        os.replace(tmp_blob, cache_dir / blob_name)
+        tmp_index = cache_dir / f"index.pkl.{os.getpid()}.tmp"
+        with open(tmp_index, 'wb') as f:
+            pickle.dump({'signature': signature, 'blob': blob_name, 'sites': offsets, 'sorted': True}, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_index, index_path)
+        _prune_site_indexes(cache_dir)
+    except OSError as e:
+        print(f"Warning: could not write site index cache: {e}", file=sys.stderr)
+    
+    return sites.get(site_id, [])
+
+
+@lru_cache(maxsize=32)
+def _load_sorted_site(transects_file: str, size: int, mtime_ns: int, site_id: str) -> bytes:
+    """Pickled, id-sorted transects of one site, memoised while the file's size and mtime are unchanged."""
+    if SITE_INDEX_CACHE_DIR is not None:
+        # Already sorted when the index was built
+        site_transects = _load_site_from_index(site_id, transects_file)
+    else:
+        site_transects = _read_features(transects_file, site_id)
         
         # Sort by transect ID to ensure proper ordering
         site_transects.sort(key=lambda x: x['properties']['id'])
+    
+    return pickle.dumps(site_transects, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def load_transects_for_site(site_id: str, transects_file: str) -> List[Dict[str, Any]]:
+    """
+    Load and filter transects for a specific site_id.
+    
+    Args:
+        site_id: The site identifier to filter by (e.g., 'aus0001')
+        transects_file: Path to the transects GeoJSON file
         
-        return site_transects
+    Returns:
+        List of transect features for the specified site
+    """
+    try:
+        stat = os.stat(transects_file)
+        # Unpickle a fresh copy per call, since the analysis annotates the transects it is given
+        return pickle.loads(_load_sorted_site(str(Path(transects_file).resolve()), stat.st_size, stat.st_mtime_ns, site_id))
         
     except FileNotFoundError:
         print(f"Error: Could not find transects file: {transects_file}", file=sys.stderr)
@@ -278,17 +548,21 @@ def load_transects_for_site(site_id: str, transects_file: str) -> List[Dict[str,
         sys.exit(1)
 
 
-def convert_geodataframe_to_transects(gdf, site_id: str) -> List[Dict[str, Any]]:
-    """
-    Convert a GeoDataFrame to the transect format expected by narrative zoning.
-    
-    Args:
-        gdf: GeoDataFrame containing transect data
-        site_id: Site ID to filter for
-        
-    Returns:
-        List of transect dictionaries with required properties
-    """
+# Transect property names and the GeoDataFrame columns they are read from
+_GEODATAFRAME_PROPERTIES = {
+    'transect_id': 'id',  # Use 'id' column, not 'transect_id'
+    'site_id': 'site_id',
+    'trend': 'trend',
+    'beach_slope': 'beach_slope',
+    'r2_score': 'r2_score',
+    'rmse': 'rmse',
+    'along_dist': 'along_dist',  # Add along_dist for zone calculations
+    'id': 'id',  # Also add 'id' for backward compatibility
+}
+
+
+def _select_site_rows(gdf, site_id: str):
+    """Return the rows of gdf for site_id, sorted by transect id."""
     if not GEOPANDAS_AVAILABLE:
         raise ImportError("geopandas is required for analyze_site_from_geodataframe function")
     
@@ -296,32 +570,80 @@ def convert_geodataframe_to_transects(gdf, site_id: str) -> List[Dict[str, Any]]
     site_transects = gdf[gdf['site_id'] == site_id].copy()
     
     if len(site_transects) == 0:
-        return []
+        return site_transects
     
     # Sort by transect_id to ensure proper ordering
-    site_transects = site_transects.sort_values('id')
-    
-    # Convert to the expected transect format
-    transects = []
-    for idx, row in site_transects.iterrows():
-        # Extract properties from the GeoDataFrame row
-        transect = {
-            'properties': {
-                'transect_id': row.get('id'),  # Use 'id' column, not 'transect_id'
-                'site_id': row.get('site_id'),
-                'trend': row.get('trend'),
-                'beach_slope': row.get('beach_slope'), 
-                'r2_score': row.get('r2_score'),
-                'rmse': row.get('rmse'),
-                'along_dist': row.get('along_dist'),  # Add along_dist for zone calculations
-                'id': row.get('id'),  # Also add 'id' for backward compatibility
-                # Add any other properties that might be needed
-            },
-            'geometry': row.get('geometry')  # Include geometry if needed
+    return site_transects.sort_values('id')
+
+
+def _site_rows_to_transects(site_transects) -> List[Dict[str, Any]]:
+    """Build transect features from site rows, reading each column once (missing columns give None)."""
+    def column(name):
+        if name in site_transects.columns:
+            return site_transects[name].tolist()
+        return [None] * len(site_transects)
+    
+    names = list(_GEODATAFRAME_PROPERTIES)
+    property_columns = [column(source) for source in _GEODATAFRAME_PROPERTIES.values()]
+    return [
+        {
+            'properties': dict(zip(names, values)),
+            'geometry': geometry  # Include geometry if needed
         }
-        transects.append(transect)
+        for geometry, *values in zip(column('geometry'), *property_columns)
+    ]
+
+
+def extract_geodataframe_columns(site_transects, zone_definitions: Dict[str, Any]) -> Dict[str, Tuple[np.ndarray, np.ndarray]]:
+    """
+    Extract the property columns of extract_property_columns straight from a site's rows.
+    
+    Numeric columns are converted as whole arrays instead of being read back out of the
+    transect dicts; the result is identical to calling extract_property_columns on the
+    output of convert_geodataframe_to_transects.
+    
+    Args:
+        site_transects: Rows of one site, as selected and sorted by convert_geodataframe_to_transects
+        zone_definitions: Dictionary of zone definitions whose condition fields are needed
+        
+    Returns:
+        Dictionary mapping field name to a (values, null_mask) tuple
+    """
+    fields = list(_ZONE_SUMMARY_FIELDS)
+    for zone_def in zone_definitions.values():
+        for cond in zone_def.get('conditions', []):
+            if cond.get('field') not in fields:
+                fields.append(cond.get('field'))
     
-    return transects
+    n = len(site_transects)
+    columns = {}
+    for field in fields:
+        source = _GEODATAFRAME_PROPERTIES.get(field)
+        if source is None or source not in site_transects.columns:
+            # Not carried over into the transect properties, so always null
+            columns[field] = (np.full(n, np.nan), np.ones(n, dtype=bool))
+            continue
+        series = site_transects[source]
+        if isinstance(series.dtype, np.dtype) and series.dtype.kind in 'biuf':
+            # Plain NumPy numeric column: NaN stays NaN (not null), as in the transect dicts
+            columns[field] = (series.to_numpy(dtype=np.float64), np.zeros(n, dtype=bool))
+        else:
+            columns[field] = _property_array(series.tolist())
+    return columns
+
+
+def convert_geodataframe_to_transects(gdf, site_id: str) -> List[Dict[str, Any]]:
+    """
+    Convert a GeoDataFrame to the transect format expected by narrative zoning.
+    
+    Args:
+        gdf: GeoDataFrame containing transect data
+        site_id: Site ID to filter for
+        
+    Returns:
+        List of transect dictionaries with required properties
+    """
+    return _site_rows_to_transects(_select_site_rows(gdf, site_id))
 
 
 def classify_transect_zone(transect: Dict[str, Any], zone_definitions: Optional[Dict[str, Any]] = None) -> str:
@@ -341,7 +663,142 @@ def classify_transect_zone(transect: Dict[str, Any], zone_definitions: Optional[
     return classify_transect_zone_custom(transect, zone_definitions)
 
 
-def identify_narrative_zones(transects: List[Dict[str, Any]], min_zone_length: int = 3, zone_definitions: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+def extract_property_column(transects: List[Dict[str, Any]], field: str) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Extract one property of every transect as an array.
+    
+    Args:
+        transects: List of transect features
+        field: Property name to extract
+        
+    Returns:
+        Tuple of (values, null_mask). Values are float64 when every present value is numeric,
+        otherwise an object array. Missing and None values are marked in null_mask.
+    """
+    return _property_array([t['properties'].get(field) for t in transects])
+
+
+def _property_array(raw: List[Any]) -> Tuple[np.ndarray, np.ndarray]:
+    """Build the (values, null_mask) pair of extract_property_column from a list of raw values."""
+    null_mask = np.fromiter((v is None for v in raw), dtype=bool, count=len(raw))
+    if all(isinstance(v, (int, float)) for v in raw if v is not None):
+        values = np.array([np.nan if v is None else v for v in raw], dtype=np.float64)
+    else:
+        values = np.empty(len(raw), dtype=object)
+        values[:] = raw
+    return values, null_mask
+
+
+def extract_property_columns(transects: List[Dict[str, Any]], zone_definitions: Dict[str, Any]) -> Dict[str, Tuple[np.ndarray, np.ndarray]]:
+    """
+    Extract every property used by classification and zone summaries once, as columns.
+    
+    Args:
+        transects: List of transect features
+        zone_definitions: Dictionary of zone definitions whose condition fields are needed
+        
+    Returns:
+        Dictionary mapping field name to the (values, null_mask) tuple from extract_property_column
+    """
+    fields = list(_ZONE_SUMMARY_FIELDS)
+    for zone_def in zone_definitions.values():
+        for cond in zone_def.get('conditions', []):
+            if cond.get('field') not in fields:
+                fields.append(cond.get('field'))
+    return {field: extract_property_column(transects, field) for field in fields}
+
+
+def evaluate_condition_bulk(column: Tuple[np.ndarray, np.ndarray], condition: Dict[str, Any]) -> np.ndarray:
+    """
+    Evaluate a single condition against a whole property column.
+    
+    Args:
+        column: (values, null_mask) tuple from extract_property_column
+        condition: Condition dictionary with operator, value, etc.
+        
+    Returns:
+        Boolean array, True where the condition is met (same rules as evaluate_condition)
+    """
+    values, null_mask = column
+    operator = condition["operator"]
+    
+    if operator == "is_null":
+        return null_mask.copy()
+    if operator not in _ARRAY_OPERATORS:
+        raise ValueError(f"Unknown operator: {operator}")
+    
+    met = np.full(len(null_mask), condition.get("allow_null", False), dtype=bool)
+    present = ~null_mask
+    met[present] = _ARRAY_OPERATORS[operator](values[present], condition["value"])
+    return met
+
+
+def classify_transects_bulk(transects: List[Dict[str, Any]], zone_definitions: Optional[Dict[str, Any]] = None, columns: Optional[Dict[str, Tuple[np.ndarray, np.ndarray]]] = None) -> List[str]:
+    """
+    Classify all transects at once, evaluating each zone's conditions as array comparisons.
+    
+    Gives the same result as calling classify_transect_zone on every transect, but walks
+    the zone definitions once instead of once per transect.
+    
+    Args:
+        transects: List of transect features with properties
+        zone_definitions: Optional custom zone definitions. If None, uses defaults.
+        columns: Optional property columns from extract_property_columns, aligned with transects.
+            Fields not present are extracted here.
+        
+    Returns:
+        List of zone classification strings, one per transect
+    """
+    if zone_definitions is None:
+        zone_definitions = get_default_zone_definitions()
+    
+    compiled = _compile_zone_definitions(zone_definitions)
+    columns = dict(columns) if columns else {}
+    
+    labels = np.full(len(transects), "stable", dtype=object)
+    # Rows not claimed by a higher-priority zone; each zone only evaluates these, so rows
+    # settled early (e.g. no_data for null trends) drop out of every later comparison
+    active = np.arange(len(transects))
+    
+    for zone_name, logic, conditions in compiled:
+        if active.size == 0:
+            break
+        
+        # If no conditions, this is a catch-all zone
+        if not conditions:
+            labels[active] = zone_name
+            break
+        
+        if logic not in ('AND', 'OR'):
+            continue
+        
+        # Short-circuit per row like all()/any(): each condition only sees the rows the earlier
+        # ones left undecided, so (as in classify_transect_zone) a later condition is never
+        # compared against a value it cannot handle, e.g. a string ERODIBILITY on a settled row
+        matched = np.full(active.size, logic == 'AND', dtype=bool)
+        undecided = np.arange(active.size)
+        for cond in conditions:
+            if undecided.size == 0:
+                break
+            if cond['field'] not in columns:
+                columns[cond['field']] = extract_property_column(transects, cond['field'])
+            values, null_mask = columns[cond['field']]
+            rows = active[undecided]
+            met = evaluate_condition_bulk((values[rows], null_mask[rows]), cond)
+            if logic == 'AND':
+                matched[undecided[~met]] = False
+                undecided = undecided[met]
+            else:
+                matched[undecided[met]] = True
+                undecided = undecided[~met]
+        
+        labels[active[matched]] = zone_name
+        active = active[~matched]
+    
+    return labels.tolist()
+
+
+def identify_narrative_zones(transects: List[Dict[str, Any]], min_zone_length: int = 3, zone_definitions: Optional[Dict[str, Any]] = None, labels: Optional[List[str]] = None, columns: Optional[Dict[str, Tuple[np.ndarray, np.ndarray]]] = None) -> List[Dict[str, Any]]:
     """
     Identify contiguous narrative zones from a sequence of transects.
     
@@ -349,6 +806,10 @@ def identify_narrative_zones(transects: List[Dict[str, Any]], min_zone_length: i
         transects: List of transect features sorted by position
         min_zone_length: Minimum number of transects to form a zone
         zone_definitions: Optional custom zone definitions
+        labels: Optional zone classification per transect from classify_transects_bulk.
+            If None, the transects are classified here.
+        columns: Optional property columns from extract_property_columns, aligned with transects.
+            Zone summaries slice these instead of re-reading each transect.
         
     Returns:
         List of zone dictionaries with metadata
@@ -356,55 +817,108 @@ def identify_narrative_zones(transects: List[Dict[str, Any]], min_zone_length: i
     if not transects:
         return []
 
-    # Precompute and store classification for each transect to avoid recomputation
-    for transect in transects:
-        transect['zone_classification'] = classify_transect_zone(transect, zone_definitions)
+    if labels is None:
+        labels = classify_transects_bulk(transects, zone_definitions, columns=columns)
+
+    # Store the classification on each transect to avoid recomputation
+    for transect, zone_type in zip(transects, labels):
+        transect['zone_classification'] = zone_type
+
+    # Find the runs of equal classifications, then summarise the runs long enough to form a zone
+    label_array = np.asarray(labels, dtype=object)
+    bounds = np.concatenate(([0], np.flatnonzero(label_array[1:] != label_array[:-1]) + 1, [len(label_array)])).tolist()
+
+    # Stack the numeric summary columns once so each zone aggregates them together
+    stacked = _stack_summary_columns(columns) if columns is not None else None
 
     zones = []
-    current_zone_type = None
-    current_zone_start = 0
-    current_zone_transects = []
     zone_counter = 1  # Start counting from 1
 
-    for i, transect in enumerate(transects):
-        zone_type = transect['zone_classification']
+    for start, stop in zip(bounds[:-1], bounds[1:]):
+        if stop - start >= min_zone_length:
+            zones.append(create_zone_summary(labels[start], transects[start:stop], start, zone_definitions, zone_counter, columns=columns, stacked=stacked))
+            zone_counter += 1
 
-        if zone_type != current_zone_type:
-            # End current zone if it meets minimum length
-            if current_zone_type is not None and len(current_zone_transects) >= min_zone_length:
-                zones.append(create_zone_summary(current_zone_type, current_zone_transects, current_zone_start, zone_definitions, zone_counter))
-                zone_counter += 1
+    return zones
 
-            # Start new zone
-            current_zone_type = zone_type
-            current_zone_start = i
-            current_zone_transects = [transect]
-        else:
-            # Continue current zone
-            current_zone_transects.append(transect)
 
-    # Don't forget the last zone
-    if current_zone_type is not None and len(current_zone_transects) >= min_zone_length:
-        zones.append(create_zone_summary(current_zone_type, current_zone_transects, current_zone_start, zone_definitions, zone_counter))
+_ZONE_SUMMARY_FIELDS = ('trend', 'beach_slope', 'r2_score', 'rmse', 'mae', 'cil', 'ciu', 'orientation')
 
-    return zones
 
+def _stack_summary_columns(columns: Dict[str, Tuple[np.ndarray, np.ndarray]]) -> Tuple[Tuple[str, ...], np.ndarray, np.ndarray]:
+    """
+    Stack the numeric zone summary columns into (F, N) value and null arrays, once per site.
+    
+    Args:
+        columns: Property columns from extract_property_columns
+        
+    Returns:
+        Tuple of (fields, values, null_mask); object columns are left out
+    """
+    fields = tuple(field for field in _ZONE_SUMMARY_FIELDS if field in columns and columns[field][0].dtype == np.float64)
+    if not fields:
+        return fields, np.empty((0, 0)), np.empty((0, 0), dtype=bool)
+    values = np.stack([columns[field][0] for field in fields])
+    null_mask = np.stack([columns[field][1] for field in fields])
+    return fields, values, null_mask
+
+
+def _block_means(values: np.ndarray, null_mask: np.ndarray) -> List[Optional[float]]:
+    """
+    Mean of the present values in each row of an (F, n) block, None for rows with none.
+    
+    Rows without nulls are averaged together in a single reduction; the rest are compressed
+    row by row, so every mean equals values[row][~null_mask[row]].mean().
+    """
+    n = null_mask.shape[1]
+    counts = n - np.count_nonzero(null_mask, axis=1)
+    means = [None] * len(counts)
+    full = np.flatnonzero(counts == n)
+    if full.size > 0:
+        for row, row_mean in zip(full.tolist(), values[full].mean(axis=1)):
+            means[row] = row_mean
+    for row in np.flatnonzero((counts > 0) & (counts < n)).tolist():
+        means[row] = values[row][~null_mask[row]].mean()
+    return means
 
-def create_zone_summary(zone_type: str, transects: List[Dict[str, Any]], start_index: int, zone_definitions: Optional[Dict[str, Any]] = None, zone_index: int = 1) -> Dict[str, Any]:
-    """Create a summary of a narrative zone."""
+
+def create_zone_summary(zone_type: str, transects: List[Dict[str, Any]], start_index: int, zone_definitions: Optional[Dict[str, Any]] = None, zone_index: int = 1, columns: Optional[Dict[str, Tuple[np.ndarray, np.ndarray]]] = None, stacked: Optional[Tuple[Tuple[str, ...], np.ndarray, np.ndarray]] = None) -> Dict[str, Any]:
+    """
+    Create a summary of a narrative zone. Site-wide columns, if given, are sliced from start_index;
+    stacked is the matching _stack_summary_columns output, aggregated in one pass per zone.
+    """
     if not transects:
         return {}
     
-    # Calculate zone statistics from transect properties using numpy for aggregates
-    trends = np.array([t['properties']['trend'] for t in transects if t['properties']['trend'] is not None])
-    slopes = np.array([t['properties']['beach_slope'] for t in transects if t['properties']['beach_slope'] is not None])
-    r2s = np.array([t['properties']['r2_score'] for t in transects if t['properties']['r2_score'] is not None])
+    stop_index = start_index + len(transects)
+    means = {}
+    present = {}
+    if stacked is not None:
+        fields, values, null_mask = stacked
+        values = values[:, start_index:stop_index]
+        null_mask = null_mask[:, start_index:stop_index]
+        means = dict(zip(fields, _block_means(values, null_mask)))
+        if 'trend' in means:
+            row = fields.index('trend')
+            present['trend'] = values[row] if not null_mask[row].any() else values[row][~null_mask[row]]
+    
+    # Extract the remaining summarised properties as arrays of their present (non-None) values
+    for field in _ZONE_SUMMARY_FIELDS:
+        if field in means:
+            continue
+        if columns is not None and field in columns:
+            values, null_mask = columns[field]
+            values = values[start_index:stop_index][~null_mask[start_index:stop_index]]
+            # A site-wide object column may still be numeric within this zone
+            if values.dtype == object and all(isinstance(v, (int, float)) for v in values):
+                values = values.astype(np.float64)
+            present[field] = values
+        else:
+            values, null_mask = extract_property_column(transects, field)
+            present[field] = values[~null_mask]
+        means[field] = present[field].mean() if present[field].size > 0 else None
 
-    rmses = np.array([t['properties']['rmse'] for t in transects if t['properties'].get('rmse') is not None])
-    maes = np.array([t['properties']['mae'] for t in transects if t['properties'].get('mae') is not None])
-    cils = np.array([t['properties']['cil'] for t in transects if t['properties'].get('cil') is not None])
-    cius = np.array([t['properties']['ciu'] for t in transects if t['properties'].get('ciu') is not None])
-    orientations = np.array([t['properties']['orientation'] for t in transects if t['properties'].get('orientation') is not None])
+    trends = present['trend']
 
     start_dist = transects[0]['properties']['along_dist']
     end_dist = transects[-1]['properties']['along_dist']
@@ -421,20 +935,20 @@ def create_zone_summary(zone_type: str, transects: List[Dict[str, Any]], start_i
         'end_transect_id': transects[-1]['properties']['id'],
 
         # Renamed fields
-        'mean_trend': trends.mean() if trends.size > 0 else None,
-        'avg_beach_slope': slopes.mean() if slopes.size > 0 else None,
+        'mean_trend': means['trend'],
+        'avg_beach_slope': means['beach_slope'],
 
         # Existing fields
-        'avg_r2': r2s.mean() if r2s.size > 0 else None,
+        'avg_r2': means['r2_score'],
         'max_trend': trends.max() if trends.size > 0 else None,
         'min_trend': trends.min() if trends.size > 0 else None,
 
         # New aggregate metrics
-        'avg_rmse': rmses.mean() if rmses.size > 0 else None,
-        'avg_mae': maes.mean() if maes.size > 0 else None,
-        'avg_cil': cils.mean() if cils.size > 0 else None,
-        'avg_ciu': cius.mean() if cius.size > 0 else None,
-        'avg_orientation': orientations.mean() if orientations.size > 0 else None,
+        'avg_rmse': means['rmse'],
+        'avg_mae': means['mae'],
+        'avg_cil': means['cil'],
+        'avg_ciu': means['ciu'],
+        'avg_orientation': means['orientation'],
 
         'transect_ids': [t['properties']['id'] for t in transects]
     }
@@ -449,6 +963,75 @@ def create_zone_summary(zone_type: str, transects: List[Dict[str, Any]], start_i
     return zone_summary
 
 
+_TEMPLATE_FORMATTER = string.Formatter()
+
+
+@lru_cache(maxsize=None)
+def _compile_description_template(template: str) -> Optional[Tuple[Tuple[str, Optional[str], Optional[str], Optional[str]], ...]]:
+    """
+    Parse a description template once into (literal, field, format_spec, conversion) parts.
+    
+    Args:
+        template: Zone description template
+        
+    Returns:
+        Parsed parts, or None when the template needs str.format itself (positional,
+        attribute, index or nested fields) or does not parse
+    """
+    try:
+        parts = tuple(_TEMPLATE_FORMATTER.parse(template))
+    except ValueError:
+        return None
+    for literal, field, format_spec, conversion in parts:
+        if field is not None and (not field.isidentifier() or '{' in format_spec):
+            return None
+    return parts
+
+
+def _zone_metric(key: str):
+    """Read a zone summary value for a template, with None or missing read as 0."""
+    return lambda zone: zone.get(key, 0) or 0
+
+
+# Template variable name -> how it is derived from a zone summary
+_ZONE_TEMPLATE_VARIABLES = {
+    'length_km': lambda zone: zone['length_meters'] / 1000,
+    'mean_trend': _zone_metric('mean_trend'),
+    'avg_trend': _zone_metric('mean_trend'),
+    'avg_trend_abs': lambda zone: abs(zone.get('mean_trend', 0) or 0),  # For backward compatibility with templates
+    'transect_count': lambda zone: zone.get('transect_count', 0),
+    'avg_beach_slope': _zone_metric('avg_beach_slope'),
+    'avg_slope': _zone_metric('avg_beach_slope'),
+    'avg_r2': _zone_metric('avg_r2'),
+    'max_trend': _zone_metric('max_trend'),
+    'min_trend': _zone_metric('min_trend'),
+    # New aggregate metrics
+    'avg_rmse': _zone_metric('avg_rmse'),
+    'avg_mae': _zone_metric('avg_mae'),
+    'avg_cil': _zone_metric('avg_cil'),
+    'avg_ciu': _zone_metric('avg_ciu'),
+    'avg_orientation': _zone_metric('avg_orientation'),
+}
+
+
+def _render_description_template(template: str, zone: Dict[str, Any]) -> str:
+    """
+    Fill a description template from a zone summary, raising the same KeyError/ValueError as
+    str.format. Parsed templates only derive the variables they reference.
+    """
+    parts = _compile_description_template(template)
+    if parts is None:
+        template_vars = {name: derive(zone) for name, derive in _ZONE_TEMPLATE_VARIABLES.items()}
+        return template.format(**template_vars)
+    pieces = []
+    for literal, field, format_spec, conversion in parts:
+        pieces.append(literal)
+        if field is not None:
+            value = _TEMPLATE_FORMATTER.convert_field(_ZONE_TEMPLATE_VARIABLES[field](zone), conversion)
+            pieces.append(format(value, format_spec))
+    return ''.join(pieces)
+
+
 def get_zone_narrative_description_custom(zone: Dict[str, Any], zone_definitions: Optional[Dict[str, Any]] = None) -> str:
     """Generate a narrative description for a zone using custom zone definitions."""
     if zone_definitions is None:
@@ -458,32 +1041,10 @@ def get_zone_narrative_description_custom(zone: Dict[str, Any], zone_definitions
     zone_def = zone_definitions.get(zone_type, {})
     template = zone_def.get('description_template', f"Unclassified zone spanning {{length_km:.1f}}km.")
     
-    # Prepare template variables
     length_km = zone['length_meters'] / 1000
-    mean_trend = zone.get('mean_trend', 0) or 0
-    avg_trend_abs = abs(mean_trend)  # For backward compatibility with templates
-    
-    template_vars = {
-        'length_km': length_km,
-        'mean_trend': mean_trend,
-        'avg_trend': mean_trend,  
-        'avg_trend_abs': avg_trend_abs,
-        'transect_count': zone.get('transect_count', 0),
-        'avg_beach_slope': zone.get('avg_beach_slope', 0) or 0,
-        'avg_slope': zone.get('avg_beach_slope', 0) or 0,  
-        'avg_r2': zone.get('avg_r2', 0) or 0,
-        'max_trend': zone.get('max_trend', 0) or 0,
-        'min_trend': zone.get('min_trend', 0) or 0,
-        # New aggregate metrics
-        'avg_rmse': zone.get('avg_rmse', 0) or 0,
-        'avg_mae': zone.get('avg_mae', 0) or 0,
-        'avg_cil': zone.get('avg_cil', 0) or 0,
-        'avg_ciu': zone.get('avg_ciu', 0) or 0,
-        'avg_orientation': zone.get('avg_orientation', 0) or 0
-    }
     
     try:
-        return template.format(**template_vars)
+        return _render_description_template(template, zone)
     except (KeyError, ValueError) as e:
         # Fallback if template formatting fails
         return f"Zone spanning {length_km:.1f}km with {zone.get('transect_count', 0)} transects."
@@ -494,22 +1055,34 @@ def get_zone_narrative_description(zone: Dict[str, Any]) -> str:
     return get_zone_narrative_description_custom(zone, None)
 
 
-def create_transect_dict(transects: List[Dict[str, Any]], zone_definitions: Optional[Dict[str, Any]] = None) -> Dict[str, Dict[str, Any]]:
+def create_transect_dict(transects: List[Dict[str, Any]], zone_definitions: Optional[Dict[str, Any]] = None, labels: Optional[List[str]] = None) -> Dict[str, Dict[str, Any]]:
     """
     Create a dictionary of transects with their zone classifications.
     
     Args:
         transects: List of transect features
         zone_definitions: Optional custom zone definitions
+        labels: Optional zone classification per transect from classify_transects_bulk.
+            If None, stored classifications are reused and the rest are classified here.
         
     Returns:
         Dictionary mapping transect IDs to transect data with zone classification
     """
     transect_dict = {}
 
-    for transect in transects:
+    if labels is not None:
+        zone_types = labels
+    else:
+        # Reuse classifications stored by identify_narrative_zones, classify the rest in one pass
+        zone_types = [transect.get('zone_classification') for transect in transects]
+        unclassified = [i for i, zone_type in enumerate(zone_types) if not zone_type]
+        if unclassified:
+            computed = classify_transects_bulk([transects[i] for i in unclassified], zone_definitions)
+            for i, zone_type in zip(unclassified, computed):
+                zone_types[i] = zone_type
+
+    for transect, zone_type in zip(transects, zone_types):
         transect_id = transect['properties']['id']
-        zone_type = transect.get('zone_classification') or classify_transect_zone(transect, zone_definitions)
 
         transect_dict[transect_id] = {
             'properties': transect['properties'],
@@ -540,7 +1113,8 @@ def analyze_site_from_geodataframe(site_id: str, gdf, min_zone_length: int = 3,
         zone_definitions = get_default_zone_definitions()
     
     # Convert GeoDataFrame to transect format
-    transects = convert_geodataframe_to_transects(gdf, site_id)
+    site_transects = _select_site_rows(gdf, site_id)
+    transects = _site_rows_to_transects(site_transects)
     
     if not transects:
         result = {
@@ -552,11 +1126,16 @@ def analyze_site_from_geodataframe(site_id: str, gdf, min_zone_length: int = 3,
         }
         return make_json_serializable(result)
     
+    # Extract the needed properties and classify every transect once, shared by zone
+    # identification and the transect dictionary
+    columns = extract_geodataframe_columns(site_transects, zone_definitions)
+    labels = classify_transects_bulk(transects, zone_definitions, columns=columns)
+    
     # Identify narrative zones
-    zones = identify_narrative_zones(transects, min_zone_length, zone_definitions)
+    zones = identify_narrative_zones(transects, min_zone_length, zone_definitions, labels=labels, columns=columns)
     
     # Create transect dictionary with zone classifications
-    transect_dict = create_transect_dict(transects, zone_definitions)
+    transect_dict = create_transect_dict(transects, zone_definitions, labels=labels)
     
     # Calculate summary statistics
     zone_type_counts = {}
@@ -609,11 +1188,16 @@ def analyze_site(site_id: str, transects_file: str, min_zone_length: int = 3, zo
         }
         return make_json_serializable(result)
     
+    # Extract the needed properties and classify every transect once, shared by zone
+    # identification and the transect dictionary
+    columns = extract_property_columns(transects, zone_definitions)
+    labels = classify_transects_bulk(transects, zone_definitions, columns=columns)
+    
     # Identify narrative zones
-    zones = identify_narrative_zones(transects, min_zone_length, zone_definitions)
+    zones = identify_narrative_zones(transects, min_zone_length, zone_definitions, labels=labels, columns=columns)
     
     # Create transect dictionary with zone classifications
-    transect_dict = create_transect_dict(transects, zone_definitions)
+    transect_dict = create_transect_dict(transects, zone_definitions, labels=labels)
     
     # Calculate summary statistics
     zone_type_counts = {}
@@ -637,6 +1221,25 @@ def analyze_site(site_id: str, transects_file: str, min_zone_length: int = 3, zo
     return make_json_serializable(result)
 
 
+def dumps_json(obj: Any, pretty: bool = False) -> str:
+    """
+    Serialize an analysis result to a JSON string, with orjson when it is installed.
+    
+    Args:
+        obj: JSON-serializable object (e.g. the output of analyze_site)
+        pretty: Indent the output by two spaces
+        
+    Returns:
+        JSON string
+    """
+    if ORJSON_AVAILABLE:
+        option = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+        if pretty:
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, option=option).decode('utf-8')
+    return json.dumps(obj, indent=2 if pretty else None, ensure_ascii=False)
+
+
 def main():
     """Main function for command-line usage."""
     parser = argparse.ArgumentParser(
@@ -666,7 +1269,7 @@ Examples:
     # Show default zone definitions if requested
     if args.show_default_zones:
         default_zones = get_default_zone_definitions()
-        print(json.dumps(default_zones, indent=2, ensure_ascii=False))
+        print(dumps_json(default_zones, pretty=True))
         return
     
     # Check required arguments if not showing defaults
@@ -688,14 +1291,11 @@ Examples:
     result = analyze_site(args.site_id, args.transects_file, args.min_zone_length, zone_definitions)
     
     # Format output
-    if args.pretty:
-        output = json.dumps(result, indent=2, ensure_ascii=False)
-    else:
-        output = json.dumps(result, ensure_ascii=False)
+    output = dumps_json(result, pretty=args.pretty)
     
     # Write output
     if args.output:
-        with open(args.output, 'w') as f:
+        with open(args.output, 'w', encoding='utf-8') as f:
             f.write(output)
         print(f"Results written to {args.output}", file=sys.stderr)
     else:
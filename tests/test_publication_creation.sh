@@ -54,6 +54,35 @@ else
     echo "ℹ️  No changes in publication.crate"
 fi
 
+# Test 6: Bulk zone classification matches per-transect classification
+echo ""
+echo "🗺️  Test 6: Checking bulk zone classification..."
+python - <<'EOF'
+import sys
+sys.path.insert(0, "../src")
+from narrative_zoning import classify_transect_zone, classify_transects_bulk
+
+# A string ERODIBILITY (as at sar1396) must only be compared where the earlier condition leaves
+# the row undecided, as all()/any() do per transect
+transects = [{"properties": props} for props in (
+    {"trend": 1.0, "ERODIBILITY": "High"},
+    {"trend": None, "ERODIBILITY": 3},
+)]
+zones = {
+    "and_zone": {"logic": "AND", "conditions": [
+        {"field": "trend", "operator": "is_null", "value": None},
+        {"field": "ERODIBILITY", "operator": ">=", "value": 2},
+    ]},
+    "or_zone": {"logic": "OR", "conditions": [
+        {"field": "trend", "operator": "<", "value": 5},
+        {"field": "ERODIBILITY", "operator": ">=", "value": 2},
+    ]},
+}
+expected = [classify_transect_zone(t, zones) for t in transects]
+assert classify_transects_bulk(transects, zones) == expected, expected
+print(f"✅ Bulk classification matches: {expected}")
+EOF
+
 echo ""
 echo "🎉 All tests passed! The publication creation workflow is working."
 echo ""